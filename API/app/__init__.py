@@ -3,21 +3,39 @@ from flask import (
     Flask, Blueprint, jsonify, send_from_directory, abort, make_response
 )
 from flask_restless import APIManager
-from flask_sqlalchemy import SQLAlchemy 
 from flask_jwt_extended import JWTManager
+from werkzeug.contrib.fixers import ProxyFix
 from instance.config import app_config
+from app.database import Database
 
 
-db = SQLAlchemy()
+db = Database()
 
 
 # these imports require the db
 from app.validators import Valid, AuthorizationError
 from app.error_handlers import errors_handler, blacklist_handler
 from app.auth import auth, caterer_auth, default_auth
+from app.current_user import current_user_handler, claims_handler
+from app.revoked_tokens import RevokedTokens
+from app.menu_cache import TodaysMenuCache
+from app.passwords import PasswordHasher
+from app.throttle import LoginThrottle
+from app.stats import stats
+from app.orders import orders
+from app.meals import meals
+from app.notifications import notifications
+from app.reports import reports
+from app.etags import etag_handler, conditional
+from app.sql_timing import sql_timing_handler
+from app.metrics import Metrics, metrics, metrics_handler, timed
+from app.pagination import keyset, streamed, paged
+from app.sparse import sparse
+from app.serializers import Serializers
 from app.models import Meal, User, Notification, Menu, Order, MenuItem
 from app.customize_routes import (
-    single_for_user, many_for_user, todays, post_delete, check_exists
+    many_for_user, todays, cached_todays, post_delete, check_exists, eager,
+    send_loaded, save_loaded, loaded_handler
 )
 
 
@@ -25,11 +43,34 @@ def create_app(config_name):
     app = Flask(__name__, instance_relative_config=True)
     app.config.from_object(app_config[config_name])
     app.config.from_pyfile('config.py')
+    if app.config['PROXY_COUNT']:
+        # clients are who the trusted proxies say, not the last proxy
+        app.wsgi_app = ProxyFix(app.wsgi_app,
+                                num_proxies=app.config['PROXY_COUNT'])
     db.init_app(app)
+    # first, so they time what the other handlers do as well
+    sql_timing_handler(app)
+    metrics_handler(app)
     app.register_blueprint(auth)
+    app.register_blueprint(stats)
+    app.register_blueprint(orders)
+    app.register_blueprint(meals)
+    app.register_blueprint(notifications)
+    app.register_blueprint(reports)
+    app.register_blueprint(metrics)
     errors_handler(app)
+    current_user_handler(app)
+    etag_handler(app)
+    loaded_handler(app)
     jwt = JWTManager(app)
+    RevokedTokens(app)
+    TodaysMenuCache(app)
+    PasswordHasher(app)
+    Metrics(app)
+    LoginThrottle(app)
+    serializers = Serializers(app)
     blacklist_handler(jwt)
+    claims_handler(jwt)
 
     @app.route('/')
     def docs():
@@ -43,15 +84,19 @@ def create_app(config_name):
             Meal,
             methods=['GET', 'POST', 'DELETE', 'PUT'],
             url_prefix='/api/v1',
-            preprocessors={
+            serializer=serializers[Meal],
+            preprocessors=timed('meals', {
                 'POST': [caterer_auth, Valid.post_meal],
-                'GET_MANY': [default_auth],
-                'GET_SINGLE': [default_auth, check_exists(Meal)],
+                'GET_MANY': [default_auth, conditional(Meal), eager(Meal),
+                             sparse(Meal), paged(Meal)],
+                'GET_SINGLE': [default_auth, check_exists(Meal),
+                               conditional(Meal), sparse(Meal),
+                               send_loaded(Meal)],
                 'PUT_SINGLE': [caterer_auth, check_exists(Meal),
-                               Valid.put_meal],
+                               Valid.put_meal, save_loaded(Meal)],
                 'DELETE_SINGLE': [caterer_auth],
                 'DELETE_MANY': [caterer_auth],
-            },
+            }),
             postprocessors={
                 'DELETE_SINGLE': [post_delete],
                 'DELETE_MANY': [post_delete],
@@ -62,16 +107,21 @@ def create_app(config_name):
             Menu,
             methods=['GET', 'POST', 'DELETE', 'PUT'],
             url_prefix='/api/v1',
+            serializer=serializers[Menu],
             collection_name='menu',
-            preprocessors={
+            preprocessors=timed('menu', {
                 'POST': [caterer_auth, Valid.post_menu],
-                'GET_SINGLE': [default_auth, check_exists(Menu)],
-                'GET_MANY': [default_auth, todays],
+                'GET_SINGLE': [default_auth, check_exists(Menu),
+                               conditional(Menu), sparse(Menu),
+                               send_loaded(Menu)],
+                'GET_MANY': [default_auth, todays, conditional(Menu),
+                             cached_todays, eager(Menu), sparse(Menu),
+                             paged(Menu)],
                 'PUT_SINGLE': [caterer_auth, check_exists(Menu),
-                               Valid.put_menu],
+                               Valid.put_menu, save_loaded(Menu)],
                 'DELETE_SINGLE': [caterer_auth],
                 'DELETE_MANY': [caterer_auth],
-            },
+            }),
             postprocessors={
                 'DELETE_SINGLE': [post_delete],
                 'DELETE_MANY': [post_delete]
@@ -82,15 +132,20 @@ def create_app(config_name):
             MenuItem,
             methods=['GET', 'POST', 'DELETE', 'PUT'],
             url_prefix='/api/v1',
-            preprocessors={
+            serializer=serializers[MenuItem],
+            preprocessors=timed('menu_items', {
                 'POST': [caterer_auth, Valid.post_menu_item],
-                'GET_SINGLE': [default_auth, check_exists(MenuItem)],
-                'GET_MANY': [default_auth],
+                'GET_SINGLE': [default_auth, check_exists(MenuItem),
+                               conditional(MenuItem), sparse(MenuItem),
+                               send_loaded(MenuItem)],
+                'GET_MANY': [default_auth, conditional(MenuItem),
+                             eager(MenuItem), sparse(MenuItem),
+                             paged(MenuItem)],
                 'PUT_SINGLE': [caterer_auth, check_exists(MenuItem),
-                               Valid.put_menu_item],
+                               Valid.put_menu_item, save_loaded(MenuItem)],
                 'DELETE_SINGLE': [caterer_auth],
                 'DELETE_MANY': [caterer_auth],
-            },
+            }),
             postprocessors={
                 'DELETE_SINGLE': [post_delete],
                 'DELETE_MANY': [post_delete]
@@ -101,16 +156,20 @@ def create_app(config_name):
             Order,
             methods=['GET', 'POST', 'DELETE', 'PUT'],
             url_prefix='/api/v1',
-            preprocessors={
+            serializer=serializers[Order],
+            preprocessors=timed('orders', {
                 'POST': [default_auth, Valid.post_order],
-                'GET_SINGLE': [default_auth, check_exists(Order), 
-                               single_for_user(Order)],
-                'GET_MANY': [default_auth, many_for_user],
+                'GET_SINGLE': [default_auth, check_exists(Order, owned=True),
+                               conditional(Order), sparse(Order),
+                               send_loaded(Order)],
+                'GET_MANY': [default_auth, many_for_user, conditional(Order),
+                             eager(Order), sparse(Order), keyset(Order),
+                             streamed(Order), paged(Order)],
                 'PUT_SINGLE': [default_auth, check_exists(Order),
-                               Valid.put_order],
+                               Valid.put_order, save_loaded(Order)],
                 'DELETE_SINGLE': [default_auth],
                 'DELETE_MANY': [caterer_auth],
-            },
+            }),
             postprocessors={
                 'DELETE_SINGLE': [post_delete],
                 'DELETE_MANY': [post_delete]
@@ -121,16 +180,25 @@ def create_app(config_name):
             Notification,
             methods=['GET', 'POST', 'DELETE', 'PUT'],
             url_prefix='/api/v1',
-            preprocessors={
+            serializer=serializers[Notification],
+            preprocessors=timed('notifications', {
                 'POST': [caterer_auth, Valid.post_notification],
-                'GET_SINGLE': [default_auth, check_exists(Notification),
-                               single_for_user(Notification)],
-                'GET_MANY': [default_auth, many_for_user],
+                'GET_SINGLE': [default_auth,
+                               check_exists(Notification, owned=True),
+                               conditional(Notification),
+                               sparse(Notification),
+                               send_loaded(Notification)],
+                'GET_MANY': [default_auth, many_for_user,
+                             conditional(Notification), eager(Notification),
+                             sparse(Notification),
+                             keyset(Notification),
+                             streamed(Notification), paged(Notification)],
                 'PUT_SINGLE': [caterer_auth, check_exists(Notification),
-                               Valid.put_notification],
+                               Valid.put_notification,
+                               save_loaded(Notification)],
                 'DELETE_SINGLE': [default_auth],
                 'DELETE_MANY': [default_auth],
-            },
+            }),
             postprocessors={
                 'DELETE_SINGLE': [post_delete],
                 'DELETE_MANY': [post_delete]
@@ -2,10 +2,10 @@ import json
 from app.models import Blacklist, User, UserType 
 from flask_restless import ProcessingException
 from app.validators import Valid, AuthorizationError
-from flask import Blueprint, request, jsonify, Response
+from app.current_user import get_current_user, current_user_is_caterer
+from flask import Blueprint, request, jsonify, Response, current_app
 from flask_jwt_extended import (
-    jwt_required, create_access_token,
-    get_jwt_identity, get_raw_jwt
+    jwt_required, create_access_token, get_raw_jwt
 )
 
 
@@ -27,8 +27,7 @@ def caterer_auth(**kwargs):
     This is similar to caterer_auth with the extra requirement of a user 
     being a caterer
     """
-    current_user = User.query.filter_by(email=get_jwt_identity()).first()
-    if not current_user.is_caterer():
+    if not current_user_is_caterer():
         raise AuthorizationError('Unauthorized access to a non-caterer')
 
 
@@ -68,11 +67,14 @@ def login():
     if not request.json.get('password'):
         return jsonify({'errors': ['Password is required']}), 400
 
+    throttle = current_app.extensions['login_throttle']
+    throttle.check(request.json['email'], request.remote_addr)
     user = User.query.filter_by(email=request.json['email']).first()
     if not user or not user.validate_password(request.json['password']):
         return jsonify({'errors': ['Invalid credentials']}), 400
+    throttle.succeeded(request.remote_addr)
 
-    access_token = create_access_token(identity=request.json['email'])
+    access_token = create_access_token(identity=user)
     return jsonify({
         'access_token': access_token,
         'user': {
@@ -88,7 +90,7 @@ def get_user():
     if not request.is_json:
         return jsonify({'message': 'Request should be JSON'}), 400
 
-    user = User.query.filter_by(email=get_jwt_identity()).first()
+    user = get_current_user()
     return jsonify({
         'user': {
             'id': user.id,
@@ -101,7 +103,8 @@ def get_user():
 @auth.route('/api/v1/auth/logout', methods=['DELETE'])
 @jwt_required
 def logout():
-    jti = get_raw_jwt()['jti']
-    blacklist = Blacklist(token=jti)
+    jwt = get_raw_jwt()
+    blacklist = Blacklist(token=jwt['jti'])
     blacklist.save()
+    current_app.extensions['revoked_tokens'].add(jwt['jti'], jwt['exp'])
     return jsonify({'message': 'Successfully logged out.'}), 200
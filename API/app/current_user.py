@@ -0,0 +1,116 @@
+import time
+from datetime import datetime
+from flask import g, jsonify, current_app, has_app_context
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from flask_jwt_extended import get_jwt_identity, get_jwt_claims
+from app.models import User, UserType, Blacklist, CLAIMS_PREFIX
+
+
+def get_current_user():
+    """
+    Returns the logged in user.
+
+    The user is looked up at most once per request and then shared by every
+    preprocessor and validator that asks for it. This assumes the request
+    has already gone through @jwt_required.
+    """
+    if g.get('current_user_loaded'):
+        g.user_hits = g.get('user_hits', 0) + 1
+        return g.current_user
+
+    g.user_lookups = g.get('user_lookups', 0) + 1
+    g.current_user = User.query.filter_by(email=get_jwt_identity()).first()
+    g.current_user_loaded = True
+    return g.current_user
+
+
+def get_current_claims():
+    """
+    Returns the id and role of the logged in user as signed into their
+    access token.
+
+    Tokens issued before the claims were added fall back to loading the
+    user from the database.
+    """
+    claims = get_jwt_claims()
+    if 'id' in claims and 'role' in claims:
+        return claims
+
+    user = get_current_user()
+    if not user:
+        return {}
+    return {'id': user.id, 'role': user.role}
+
+
+def current_user_id():
+    return get_current_claims().get('id')
+
+
+def current_user_is_caterer():
+    return get_current_claims().get('role') == UserType.CATERER
+
+
+def invalidate_claims(session, user_id):
+    """
+    Rejects every token issued to this user before now so they have to log
+    in again and pick up their new claims.
+
+    The change is stored in the blacklist table, where every worker picks
+    it up, PostgreSQL stores it from a trigger. This worker applies it
+    straight away.
+    """
+    if session.get_bind().dialect.name != 'postgresql':
+        change = Blacklist(CLAIMS_PREFIX + str(user_id))
+        change.created_at = datetime.utcnow()
+        session.add(change)
+    if has_app_context() and 'revoked_tokens' in current_app.extensions:
+        current_app.extensions['revoked_tokens'].claims_changed(
+            user_id, time.time())
+
+
+@event.listens_for(Session, 'before_flush')
+def invalidate_claims_on_role_change(session, context, instances):
+    for user in list(session.dirty):
+        if isinstance(user, User) and \
+                inspect(user).attrs.role.history.has_changes():
+            invalidate_claims(session, user.id)
+
+
+def reset_current_user():
+    """
+    Clears the cached user and the lookup counters before each request.
+
+    The counters can be read from `g.user_lookups` (database lookups) and
+    `g.user_hits` (lookups served from the cache).
+    """
+    g.current_user = None
+    g.current_user_loaded = False
+    g.user_lookups = 0
+    g.user_hits = 0
+
+
+def current_user_handler(app):
+    app.before_request(reset_current_user)
+
+
+def claims_handler(jwt):
+    @jwt.user_identity_loader
+    def user_identity(user):
+        return user.email
+
+    @jwt.user_claims_loader
+    def user_claims(user):
+        return {'id': user.id, 'role': user.role, 'issued': time.time()}
+
+    @jwt.claims_verification_loader
+    def check_claims_are_fresh(claims):
+        changed_at = current_app.extensions['revoked_tokens'] \
+            .claims_changed_at(claims.get('id'))
+        return changed_at is None or claims.get('issued', 0) > changed_at
+
+    @jwt.claims_verification_failed_loader
+    def stale_claims_response():
+        return jsonify({
+            'message': 'Your access has changed, please log in again'
+        }), 401
@@ -1,33 +1,48 @@
 import json
 from datetime import datetime
-from flask_jwt_extended import get_jwt_identity
-from flask import abort, make_response, jsonify
-from app.models import Blacklist, User
+from flask import (
+    abort, make_response, jsonify, request, current_app, g,
+    has_request_context
+)
+from flask_restless.helpers import has_field, strings_to_dates
+from sqlalchemy import event
+from sqlalchemy.orm import Query
+from app import db
+from app.models import Blacklist, User, serialize_loads
+from app.current_user import current_user_id, current_user_is_caterer
 
 
-def single_for_user(model):
+def loaded(model, instance_id):
     """
-    This returns a flask-restless preprocessor that ensures that this
-    user is accessing their own resource if they are not an administrator.
+    Returns the row of `model` with this id, loading it at most once per
+    request so every preprocessor and handler that needs it shares it.
+    GET requests load it along with the relations it is serialized with.
+    """
+    key = (model, str(instance_id))
+    if g.get('loaded_key') != key:
+        query = model.query
+        if request.method == 'GET':
+            query = query.options(*serialize_loads[model])
+        g.loaded = query.filter(model.id == instance_id).first()
+        g.loaded_key = key
+    return g.loaded
 
-    The preprocessor would return an unauthorized warning if it is not the
-    case.
 
-    This assumes that the this user is not a guest.
-    """
-    def get_single_for_user(instance_id=None, **kwargs):
-        """
-        Get the logged in user and ensure they are accessing their
-        own resource data.
-        """
-        current_user = User.query.filter_by(email=get_jwt_identity()).first()
-        if not current_user.is_caterer():
-            model_instance = model.query.get(instance_id)
-            if current_user.id != model_instance.user_id:
-                abort(make_response(
-                    jsonify({'message': 'Unauthorized access to this order'}), 
-                            401))
-    return get_single_for_user
+def forget_loaded():
+    g.loaded = None
+    g.loaded_key = None
+
+
+def loaded_handler(app):
+    app.before_request(forget_loaded)
+
+
+def check_owner(model_instance):
+    if not current_user_is_caterer() and \
+            current_user_id() != model_instance.user_id:
+        abort(make_response(
+            jsonify({'message': 'Unauthorized access to this order'}), 
+                    401))
 
 
 def many_for_user(search_params=None, **kwargs):
@@ -38,12 +53,11 @@ def many_for_user(search_params=None, **kwargs):
     This assumes the model has a user_id referencing the user and that
     the this user is not a guest.
     """
-    current_user = User.query.filter_by(email=get_jwt_identity()).first()
-    if not current_user.is_caterer():
+    if not current_user_is_caterer():
         search_params['filters'] = [{
             'name': 'user_id', 
             'op': 'eq', 
-            'val': current_user.id
+            'val': current_user_id()
         }]
 
 
@@ -60,6 +74,34 @@ def todays(search_params=None, **kwargs):
     }] 
 
 
+def cached_todays(**kwargs):
+    """
+    This will answer /menu/ from the cached copy of today's menu when the
+    plain list is requested, otherwise it lets the request through and
+    marks it so its response gets cached.
+
+    This needs the versions `conditional` looked up, so the copy is only
+    served while it matches the ETag the client is given.
+    """
+    if request.args:
+        return
+
+    cache = current_app.extensions['todays_menu']
+    day = str(datetime.utcnow().date())
+    versions = g.get('versions')
+    snapshot = cache.get(day, versions)
+    if snapshot is None:
+        g.todays_menu_key = (day, cache.generation, versions)
+        return
+
+    response = make_response(snapshot['body'])
+    response.mimetype = 'application/json'
+    response.headers['X-Cache'] = 'HIT'
+    if snapshot['link']:
+        response.headers['Link'] = snapshot['link']
+    abort(response)
+
+
 def post_delete(was_deleted=None, **kwargs):
     """
     This allows us to add a message to a delete query.
@@ -70,10 +112,13 @@ def post_delete(was_deleted=None, **kwargs):
         abort(make_response(jsonify({'message': 'Not found'}), 404))
 
 
-def check_exists(model):
+def check_exists(model, owned=False):
     """
     This allows us to return a custom message if a resource is not 
     found
+
+    With `owned`, users who are not administrators may only access their
+    own resources, checked on the same row.
     """
     def pre_get_model(instance_id=None, **kwargs):
         try: 
@@ -81,8 +126,72 @@ def check_exists(model):
         except:
             abort(make_response(jsonify({'message': 'Id must be an integer'}), 
                                 400))
-        if not model.query.get(instance_id):
+        model_instance = loaded(model, instance_id)
+        if not model_instance:
             abort(make_response(jsonify({'message': 'Not found'}), 
                                 404))
+        if owned:
+            check_owner(model_instance)
     return pre_get_model
 
+
+def send_loaded(model):
+    """
+    This returns a flask-restless preprocessor that answers a GET request
+    with the row check_exists loaded instead of loading it again.
+
+    It has to come last, any preprocessor after it would not run.
+    """
+    def pre_send(instance_id=None, **kwargs):
+        serialize = current_app.extensions['serializers'][model]
+        abort(jsonify(serialize(loaded(model, instance_id))))
+    return pre_send
+
+
+def save_loaded(model):
+    """
+    This returns a flask-restless preprocessor that applies a validated PUT
+    to the row check_exists loaded and answers with it, instead of
+    counting, loading and reloading it again.
+
+    It has to come last, any preprocessor after it would not run.
+    """
+    def pre_save(instance_id=None, data=None, **kwargs):
+        for field in data:
+            if not has_field(model, field):
+                abort(make_response(jsonify({
+                    'message': "Model does not have field '{}'".format(field)
+                }), 400))
+
+        instance = loaded(model, instance_id)
+        for field, value in strings_to_dates(model, data).items():
+            setattr(instance, field, value)
+        db.session.commit()
+        serialize = current_app.extensions['serializers'][model]
+        abort(jsonify(serialize(instance)))
+    return pre_save
+
+
+def eager(model):
+    """
+    This returns a flask-restless preprocessor that makes the query which
+    fetches the resources of this request load their relations up front,
+    as set out in `serialize_loads`, instead of one by one while they get
+    serialized.
+    """
+    def pre_eager(**kwargs):
+        g.eager_model = model
+    return pre_eager
+
+
+@event.listens_for(Query, 'before_compile', retval=True)
+def load_for_serializing(query):
+    if not has_request_context():
+        return query
+    model = g.get('eager_model')
+    descriptions = query.column_descriptions
+    # only queries for whole rows of the model, not counts or columns
+    if model is None or len(descriptions) != 1 or \
+            descriptions[0]['type'] is not model:
+        return query
+    return query.options(*serialize_loads[model])
@@ -0,0 +1,204 @@
+import time
+import random
+import threading
+from flask import g, request, has_request_context
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import event, orm
+from sqlalchemy.exc import TimeoutError
+from sqlalchemy.pool import QueuePool, NullPool
+
+
+# pool options SQLite files have no use for, they connect per checkout
+QUEUE_POOL_OPTIONS = ('pool_size', 'max_overflow', 'pool_timeout')
+
+
+class PoolStats:
+    """ Checkouts of a pool and how long they waited for a connection """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait = 0.0
+        self.max_wait = 0.0
+
+    def checked_out(self, wait):
+        with self.lock:
+            self.checkouts += 1
+            self.wait += wait
+            self.max_wait = max(self.max_wait, wait)
+
+    def timed_out(self):
+        with self.lock:
+            self.timeouts += 1
+
+    def as_dict(self):
+        return {
+            'checkouts': self.checkouts,
+            'timeouts': self.timeouts,
+            'wait': round(self.wait, 6),
+            'average_wait': round(self.wait / max(self.checkouts, 1), 6),
+            'max_wait': round(self.max_wait, 6),
+        }
+
+
+class TimedPool(object):
+    """ Times the checkouts of the pool class it is mixed into """
+
+    def __init__(self, *args, **kwargs):
+        super(TimedPool, self).__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def _do_get(self):
+        started = time.time()
+        try:
+            connection = super(TimedPool, self)._do_get()
+        except TimeoutError:
+            self.stats.timed_out()
+            raise
+        self.stats.checked_out(time.time() - started)
+        return connection
+
+
+class TimedQueuePool(TimedPool, QueuePool):
+    pass
+
+
+class TimedNullPool(TimedPool, NullPool):
+    pass
+
+
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# cookie telling until when, in seconds since the epoch, the client that
+# sends it reads from the primary
+READ_PRIMARY_COOKIE = 'read_primary_until'
+
+
+def reads_primary(seconds):
+    """
+    Whether the client wrote in the last `seconds`. Later times than
+    that are not ours and are ignored.
+    """
+    try:
+        until = float(request.cookies.get(READ_PRIMARY_COOKIE, 0))
+    except ValueError:
+        return False
+    now = time.time()
+    return now < until <= now + seconds
+
+
+class RoutingSession(SignallingSession):
+    """
+    Sends the statements of read-only requests to one of the
+    SQLALCHEMY_REPLICA_BINDS, picked once per request, and everything
+    else to the primary.
+
+    A request reads from the primary once it has written anything, and
+    so does the client that sent it for REPLICA_STICKY_SECONDS after, so
+    they read their own writes while the replicas catch up. The client
+    keeps that time in a cookie, so it holds whichever worker it reaches.
+    """
+
+    def __init__(self, db, **options):
+        self.db = db
+        super(RoutingSession, self).__init__(db, **options)
+
+    def get_bind(self, mapper=None, clause=None):
+        replica = self.replica()
+        if replica is not None:
+            return self.db.get_engine(self.app, bind=replica)
+        return super(RoutingSession, self).get_bind(mapper, clause)
+
+    def replica(self):
+        replicas = self.app.config['SQLALCHEMY_REPLICA_BINDS']
+        if not replicas or self._flushing or not has_request_context() \
+                or request.method not in READ_METHODS \
+                or g.get('wrote') \
+                or reads_primary(self.app.config['REPLICA_STICKY_SECONDS']):
+            return None
+        if g.get('replica') not in replicas:
+            g.replica = random.choice(replicas)
+        return g.replica
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def flushed(session, context):
+    if has_request_context():
+        g.wrote = True
+
+
+@event.listens_for(RoutingSession, 'after_bulk_update')
+@event.listens_for(RoutingSession, 'after_bulk_delete')
+def bulk_written(context):
+    if has_request_context():
+        g.wrote = True
+
+
+class Database(SQLAlchemy):
+    """
+    SQLAlchemy with the pool settings of the config class applied, and
+    its pool timed.
+
+    Besides the SQLALCHEMY_POOL_* settings Flask-SQLAlchemy reads,
+    SQLALCHEMY_POOL_PRE_PING tests connections as they are checked out
+    and SQLALCHEMY_STATEMENT_TIMEOUT has PostgreSQL cancel statements
+    running longer than that many milliseconds.
+    """
+
+    def init_app(self, app):
+        app.config.setdefault('SQLALCHEMY_POOL_PRE_PING', False)
+        app.config.setdefault('SQLALCHEMY_STATEMENT_TIMEOUT', None)
+        app.config.setdefault('SQLALCHEMY_REPLICA_BINDS', [])
+        app.config.setdefault('REPLICA_STICKY_SECONDS', 5)
+        super(Database, self).init_app(app)
+
+        @app.before_request
+        def reset_replica():
+            g.replica = None
+            g.wrote = False
+
+        @app.after_request
+        def stick_writer(response):
+            if g.get('wrote') and app.config['SQLALCHEMY_REPLICA_BINDS']:
+                seconds = app.config['REPLICA_STICKY_SECONDS']
+                until = '{:.3f}'.format(time.time() + seconds)
+                response.set_cookie(READ_PRIMARY_COOKIE, until,
+                                    max_age=seconds, httponly=True)
+            return response
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def apply_driver_hacks(self, app, info, options):
+        if info.drivername == 'sqlite':
+            for option in QUEUE_POOL_OPTIONS:
+                options.pop(option, None)
+        options['pool_pre_ping'] = app.config['SQLALCHEMY_POOL_PRE_PING']
+        timeout = app.config['SQLALCHEMY_STATEMENT_TIMEOUT']
+        if timeout and info.drivername.startswith('postgres'):
+            options.setdefault('connect_args', {})['options'] = \
+                '-c statement_timeout={}'.format(timeout)
+
+        super(Database, self).apply_driver_hacks(app, info, options)
+        if options.get('poolclass') is NullPool:
+            options['poolclass'] = TimedNullPool
+        elif 'poolclass' not in options:
+            options['poolclass'] = TimedQueuePool
+
+    def pool_stats(self, app=None):
+        """ Counters and, for a queue pool, the state of the pool """
+        app = self.get_app(app)
+        pool = self.get_engine(app).pool
+        stats = {'pool': type(pool).__name__}
+        if isinstance(pool, TimedPool):
+            stats.update(pool.stats.as_dict())
+        if isinstance(pool, QueuePool):
+            stats.update({
+                'size': pool.size(),
+                'max_overflow': app.config['SQLALCHEMY_MAX_OVERFLOW'],
+                'checked_out': pool.checkedout(),
+                'checked_in': pool.checkedin(),
+                'overflow': max(pool.overflow(), 0),
+            })
+        return stats
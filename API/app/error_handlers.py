@@ -1,16 +1,17 @@
-from flask import abort, make_response, jsonify, Blueprint
-from app.models import Blacklist
-from flask_jwt_extended import get_raw_jwt
+from flask import abort, make_response, jsonify, Blueprint, current_app
 from werkzeug.exceptions import HTTPException, default_exceptions
 from app.validators import AuthorizationError
+from app.passwords import PasswordPoolBusy
+from app.throttle import LoginThrottled
 
 
 
 def errors_handler(app):
     # jsonify http errors
     for code in default_exceptions.keys():
+        # code is bound now, the loop moves on before any error is handled
         @app.errorhandler(code)
-        def handle_error(ex):
+        def handle_error(ex, code=code):
             return jsonify({'message': str(ex)}), code
 
     # jsonify authorization error
@@ -18,9 +19,23 @@ def errors_handler(app):
     def handle_authorization_error(err):
         return jsonify({'message': str(err)}), 401
 
+    # ask clients to come back when passwords are piling up
+    @app.errorhandler(PasswordPoolBusy)
+    def handle_password_pool_busy(err):
+        response = jsonify({'message': str(err)})
+        response.headers['Retry-After'] = '1'
+        return response, 503
+
+    # turn away login attempts over the limit before hashing anything
+    @app.errorhandler(LoginThrottled)
+    def handle_login_throttled(err):
+        response = jsonify({'message': str(err)})
+        response.headers['Retry-After'] = str(err.retry_after)
+        return response, 429
+
 
 def blacklist_handler(jwt):
     @jwt.token_in_blacklist_loader
     def check_token_in_blacklist(decrypted_token):
-        return Blacklist.query.filter_by(
-                    token=get_raw_jwt()['jti']).first() is not None
+        revoked_tokens = current_app.extensions['revoked_tokens']
+        return decrypted_token['jti'] in revoked_tokens
@@ -0,0 +1,103 @@
+import hashlib
+from datetime import datetime
+from flask import request, g, abort, make_response
+from flask_restless.search import create_query
+from sqlalchemy import inspect
+from app import db
+from app.current_user import current_user_id
+from app.sparse import is_sparse, parse_include
+
+
+def related_queries(model, query, include, every=False):
+    """
+    Yields (model, query) for the rows related to those in `query` that
+    get serialized along with them: every direct relation when `every`
+    is set, plus the relations named in the `include` tree, nested ones
+    included.
+    """
+    ids = query.order_by(None)
+    for relation in inspect(model).relationships:
+        if not every and relation.key not in include:
+            continue
+        related = relation.mapper.class_
+        for local, remote in relation.local_remote_pairs:
+            related_query = related.query.filter(
+                remote.in_(ids.with_entities(local)))
+            yield related, related_query
+            for nested in related_queries(related, related_query,
+                                          include.get(relation.key, {})):
+                yield nested
+
+
+def versions(model, query, include=None):
+    """
+    Returns the latest updated_at and the row count of the rows in `query`
+    and of the rows related to them that get serialized along with them,
+    all in a single round trip.
+    """
+    queries = [(model, query)]
+    queries.extend(related_queries(model, query, include or {}, every=True))
+
+    columns = []
+    for related, related_query in queries:
+        related_query = related_query.order_by(None)
+        columns.append(related_query.with_entities(
+            db.func.max(related.updated_at)).as_scalar())
+        columns.append(related_query.with_entities(
+            db.func.count(related.id)).as_scalar())
+    return list(db.session.query(*columns).one())
+
+
+def conditional(model):
+    """
+    This returns a flask-restless preprocessor for GET requests that
+    answers with 304 Not Modified when the client's ETag or
+    If-Modified-Since is still current, before anything is serialized.
+    """
+    def pre_conditional(instance_id=None, search_params=None, **kwargs):
+        if instance_id is not None:
+            query = model.query.filter(model.id == instance_id)
+        else:
+            try:
+                query = create_query(db.session, model, search_params)
+            except Exception:
+                # let flask-restless report the bad query
+                return
+
+        result = versions(model, query,
+                          parse_include() if is_sparse() else None)
+        modified = [value for value in result if isinstance(value, datetime)]
+        last_modified = max(modified).replace(microsecond=0) \
+            if modified else None
+        etag = hashlib.md5(repr((
+            request.full_path, current_user_id(), result
+        )).encode('utf-8')).hexdigest()
+
+        if request.if_none_match:
+            not_modified = request.if_none_match.contains(etag)
+        else:
+            not_modified = last_modified is not None and \
+                request.if_modified_since is not None and \
+                last_modified <= request.if_modified_since
+        g.etag = (etag, last_modified)
+        g.versions = result
+        if not_modified:
+            abort(make_response('', 304))
+    return pre_conditional
+
+
+def add_etag(response):
+    validators = g.pop('etag', None)
+    if validators is None or response.status_code not in (200, 304):
+        return response
+
+    etag, last_modified = validators
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def etag_handler(app):
+    app.after_request(add_etag)
@@ -0,0 +1,132 @@
+import csv
+import json
+import time
+import six
+from app import db
+from app.models import Meal
+from app.auth import caterer_auth
+from app.validators import Valid
+from flask import Blueprint, request, jsonify, current_app
+from flask_restless import ProcessingException
+
+
+meals = Blueprint('meals', __name__)
+
+
+def decode(value):
+    """ Decodes the UTF-8 fields python 2's csv module reads as bytes """
+    if isinstance(value, bytes):
+        return value.decode('utf-8')
+    if isinstance(value, list):
+        return [decode(item) for item in value]
+    return value
+
+
+def read_rows(lines, format):
+    """
+    Yields (line number, fields) for every row of a CSV file with a
+    header or of a JSON-lines file. Rows that cannot be parsed come out
+    with fields set to None.
+    """
+    if format == 'csv':
+        if six.PY2:
+            # python 2's csv module only reads byte strings
+            lines = (line.encode('utf-8') for line in lines)
+        reader = csv.DictReader(lines)
+        for fields in reader:
+            yield reader.line_num, dict(
+                (decode(key), decode(value)) for key, value in fields.items())
+        return
+
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            fields = json.loads(line)
+        except ValueError:
+            fields = None
+        yield number, fields
+
+
+def import_meals(lines, format, chunk_size=500):
+    """
+    Imports meals from an iterable of text lines, a chunk at a time.
+
+    Each chunk costs one query for existing names and one bulk insert.
+    Invalid rows are skipped and reported, the valid ones are imported.
+    """
+    started = time.time()
+    report = {'imported': 0, 'errors': []}
+    seen = set()
+    chunk = []
+
+    def flush():
+        existing = set(name for name, in db.session.query(Meal.name).filter(
+            Meal.name.in_([fields['name'] for _, fields in chunk])))
+        mappings = []
+        for number, fields in chunk:
+            if fields['name'] in existing:
+                report['errors'].append(
+                    {'line': number, 'message': 'Meal name must be unique'})
+            else:
+                mappings.append(fields)
+        db.session.bulk_insert_mappings(Meal, mappings)
+        db.session.commit()
+        report['imported'] += len(mappings)
+        del chunk[:]
+
+    for number, fields in read_rows(lines, format):
+        if not isinstance(fields, dict):
+            report['errors'].append({'line': number, 'message': 'Bad row'})
+            continue
+        try:
+            Valid.meal(fields)
+        except ProcessingException as err:
+            report['errors'].append(
+                {'line': number, 'message': err.description})
+            continue
+
+        name = fields['name'].strip()
+        if name in seen:
+            report['errors'].append(
+                {'line': number, 'message': 'Meal name must be unique'})
+            continue
+        seen.add(name)
+
+        chunk.append((number, {
+            'name': name,
+            'cost': float(fields['cost']),
+            'img_path': fields.get('img_path') or None,
+        }))
+        if len(chunk) >= chunk_size:
+            flush()
+    if chunk:
+        flush()
+
+    report['seconds'] = round(time.time() - started, 3)
+    report['rows_per_second'] = round(
+        (report['imported'] + len(report['errors'])) /
+        max(report['seconds'], 0.001))
+    return report
+
+
+@meals.route('/api/v1/meals/import', methods=['POST'])
+def import_catalog():
+    """
+    Imports a catalog of meals streamed in the request body as CSV
+    (text/csv) or JSON lines (application/x-ndjson).
+    """
+    caterer_auth()
+    if request.mimetype == 'text/csv':
+        format = 'csv'
+    elif request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+        format = 'jsonl'
+    else:
+        return jsonify({
+            'message': 'Request should be CSV or JSON lines'
+        }), 415
+
+    lines = (line.decode('utf-8') for line in request.stream)
+    report = import_meals(lines, format,
+                          current_app.config['MEAL_IMPORT_CHUNK_SIZE'])
+    return jsonify(report), 200
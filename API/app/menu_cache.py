@@ -0,0 +1,93 @@
+import time
+from flask import current_app, g, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app.models import Menu, MenuItem, Meal
+
+
+class TodaysMenuCache:
+    """
+    Holds the rendered response of GET /api/v1/menu for today.
+
+    The snapshot is dropped whenever a menu, menu item or meal is written
+    through this process, when the UTC day changes and after
+    TODAYS_MENU_CACHE_TTL seconds. It is kept with the versions its ETag
+    was computed from and only served while they are still the live ones,
+    so writes made by other workers are never answered with a stale body
+    under a current ETag.
+    """
+
+    def __init__(self, app=None):
+        self.snapshot = None
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.ttl = app.config['TODAYS_MENU_CACHE_TTL']
+        app.extensions['todays_menu'] = self
+        app.after_request(self.store_response)
+
+    def get(self, day, versions):
+        snapshot = self.snapshot
+        if snapshot and snapshot['day'] == day and \
+                snapshot['versions'] == versions and \
+                time.time() - snapshot['stored_at'] < self.ttl:
+            self.hits += 1
+            return snapshot
+        self.misses += 1
+        return None
+
+    def invalidate(self):
+        self.generation += 1
+        self.invalidations += 1
+        self.snapshot = None
+
+    def store_response(self, response):
+        """
+        Keeps the response of a cache miss, unless the menu changed while
+        it was being rendered.
+        """
+        key = g.pop('todays_menu_key', None)
+        if key is None or response.status_code != 200:
+            return response
+
+        day, generation, versions = key
+        if generation == self.generation:
+            self.snapshot = {
+                'day': day,
+                'versions': versions,
+                'stored_at': time.time(),
+                'body': response.get_data(),
+                'link': response.headers.get('Link'),
+            }
+        response.headers['X-Cache'] = 'MISS'
+        return response
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'invalidations': self.invalidations,
+            'cached': self.snapshot is not None,
+        }
+
+
+def invalidate_todays_menu(*args, **kwargs):
+    if has_app_context() and 'todays_menu' in current_app.extensions:
+        current_app.extensions['todays_menu'].invalidate()
+
+
+for model in (Menu, MenuItem, Meal):
+    for name in ('after_insert', 'after_update', 'after_delete'):
+        event.listen(model, name, invalidate_todays_menu)
+
+
+@event.listens_for(Session, 'after_bulk_update')
+@event.listens_for(Session, 'after_bulk_delete')
+def invalidate_todays_menu_in_bulk(context):
+    if context.mapper.class_ in (Menu, MenuItem, Meal):
+        invalidate_todays_menu()
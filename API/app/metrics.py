@@ -0,0 +1,306 @@
+import os
+import glob
+import errno
+import json
+import time
+import bisect
+import threading
+from functools import wraps
+from timeit import default_timer
+from flask import Blueprint, Response, current_app, g, request, jsonify
+from app import db
+
+
+metrics = Blueprint('metrics', __name__)
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# name -> (type, help) of everything served at /metrics
+METRICS = {
+    'http_request_duration_seconds': (
+        'histogram', 'Time to handle a request, by route and method'),
+    'http_requests_total': (
+        'counter', 'Requests handled, by route, method and status'),
+    'http_errors_total': (
+        'counter', 'Requests answered with 4xx or 5xx, by status'),
+    'preprocessor_duration_seconds': (
+        'histogram', 'Time spent in each flask-restless preprocessor'),
+    'db_pool_checkouts_total': (
+        'counter', 'Connections checked out of the database pool'),
+    'db_pool_timeouts_total': (
+        'counter', 'Checkouts that gave up waiting for a connection'),
+    'db_pool_wait_seconds_total': (
+        'counter', 'Time spent waiting for database connections'),
+    'db_pool_checked_out': (
+        'gauge', 'Database connections in use'),
+    'db_pool_checked_in': (
+        'gauge', 'Idle database connections in the pool'),
+    'db_pool_overflow': (
+        'gauge', 'Database connections open beyond the pool size'),
+    'login_throttle_allowed_total': (
+        'counter', 'Login attempts let through by the throttle'),
+    'login_throttle_throttled_total': (
+        'counter', 'Login attempts turned away, by the bucket that ran out'),
+}
+
+
+class Metrics:
+    """
+    Counters, histograms and gauges of this worker.
+
+    With METRICS_DIR set every worker writes them to a file of its own
+    there at most every METRICS_FLUSH_SECONDS, and /metrics adds up the
+    files of all of them. Counters of workers that have exited still
+    count, their gauges do not. The directory should be emptied when the
+    app is deployed.
+    """
+
+    def __init__(self, app=None):
+        self.counters = {}
+        self.histograms = {}
+        self.lock = threading.Lock()
+        self.flushed = 0
+        self.started = int(time.time())
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.directory = app.config['METRICS_DIR']
+        self.flush_interval = app.config['METRICS_FLUSH_SECONDS']
+        app.extensions['metrics'] = self
+
+    def count(self, name, labels, value=1):
+        key = (name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, labels, seconds):
+        key = (name, labels)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = \
+                    [[0] * len(BUCKETS), 0.0, 0]
+            bucket = bisect.bisect_left(BUCKETS, seconds)
+            if bucket < len(BUCKETS):
+                histogram[0][bucket] += 1
+            histogram[1] += seconds
+            histogram[2] += 1
+
+    def snapshot(self, gauges):
+        with self.lock:
+            return {
+                'pid': os.getpid(),
+                'counters': [[name, labels, value] for (name, labels), value
+                             in self.counters.items()],
+                'histograms': [[name, labels, list(buckets), total, count]
+                               for (name, labels), (buckets, total, count)
+                               in self.histograms.items()],
+                'gauges': gauges,
+            }
+
+    def path(self):
+        return os.path.join(self.directory, '{}-{}.json'.format(
+            os.getpid(), self.started))
+
+    def due(self):
+        return self.directory and \
+            time.time() - self.flushed >= self.flush_interval
+
+    def flush(self, gauges):
+        """ Writes this worker's file for the others to read """
+        self.flushed = time.time()
+        path = self.path()
+        with open(path + '.tmp', 'w') as file:
+            json.dump(self.snapshot(gauges), file)
+        # replaces the old file in one step on POSIX
+        os.rename(path + '.tmp', path)
+
+    def snapshots(self, gauges):
+        """ The snapshots of every worker, this one's up to date """
+        if not self.directory:
+            return [self.snapshot(gauges)]
+        self.flush(gauges)
+        snapshots = []
+        for path in glob.glob(os.path.join(self.directory, '*.json')):
+            try:
+                with open(path) as file:
+                    snapshots.append(json.load(file))
+            except (IOError, ValueError):
+                # gone or being replaced, its next version counts
+                continue
+        return snapshots
+
+    def render(self, gauges):
+        """ All the workers' metrics in the Prometheus text format """
+        counters, histograms, live_gauges = {}, {}, {}
+        for snapshot in self.snapshots(gauges):
+            for name, labels, value in snapshot['counters']:
+                key = (name, freeze(labels))
+                counters[key] = counters.get(key, 0) + value
+            for name, labels, buckets, total, count in \
+                    snapshot['histograms']:
+                key = (name, freeze(labels))
+                summed = histograms.setdefault(
+                    key, [[0] * len(BUCKETS), 0.0, 0])
+                summed[0] = [a + b for a, b in zip(summed[0], buckets)]
+                summed[1] += total
+                summed[2] += count
+            if is_alive(snapshot['pid']):
+                for name, value in snapshot['gauges']:
+                    live_gauges[name] = live_gauges.get(name, 0) + value
+
+        samples = dict((name, []) for name in METRICS)
+        for (name, labels), value in sorted(counters.items()):
+            samples[name].append(sample(name, labels, value))
+        for name, value in sorted(live_gauges.items()):
+            samples[name].append(sample(name, (), value))
+        for (name, labels), (buckets, total, count) in \
+                sorted(histograms.items()):
+            cumulative = 0
+            for bound, bucket in zip(BUCKETS, buckets):
+                cumulative += bucket
+                samples[name].append(sample(
+                    name + '_bucket', labels + (('le', str(bound)),),
+                    cumulative))
+            samples[name].append(sample(
+                name + '_bucket', labels + (('le', '+Inf'),), count))
+            samples[name].append(sample(name + '_sum', labels, total))
+            samples[name].append(sample(name + '_count', labels, count))
+
+        lines = []
+        for name in sorted(samples):
+            if not samples[name]:
+                continue
+            kind, help = METRICS[name]
+            lines.append('# HELP {} {}'.format(name, help))
+            lines.append('# TYPE {} {}'.format(name, kind))
+            lines.extend(samples[name])
+        return '\n'.join(lines) + '\n'
+
+
+def freeze(labels):
+    return tuple(tuple(pair) for pair in labels)
+
+
+def is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except OSError as error:
+        # EPERM means it is there but not ours to signal
+        return error.errno != errno.ESRCH
+    return True
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"') \
+        .replace('\n', '\\n')
+
+
+def sample(name, labels, value):
+    if labels:
+        name += '{' + ','.join('{}="{}"'.format(key, escape(label))
+                               for key, label in labels) + '}'
+    return '{} {}'.format(name, repr(float(value)))
+
+
+def pool_metrics():
+    """ Counters and gauges of this worker's database pool """
+    stats = db.pool_stats()
+    counters = [
+        ('db_pool_checkouts_total', stats.get('checkouts', 0)),
+        ('db_pool_timeouts_total', stats.get('timeouts', 0)),
+        ('db_pool_wait_seconds_total', stats.get('wait', 0)),
+    ]
+    gauges = [(name, stats[key]) for name, key in (
+        ('db_pool_checked_out', 'checked_out'),
+        ('db_pool_checked_in', 'checked_in'),
+        ('db_pool_overflow', 'overflow')) if key in stats]
+    return counters, gauges
+
+
+def worker_gauges(collector):
+    """
+    Brings the pool counters up to date and returns this worker's
+    gauges. The pool counts on its own, so its totals are copied over.
+    """
+    counters, gauges = pool_metrics()
+    with collector.lock:
+        for name, value in counters:
+            collector.counters[(name, ())] = value
+    return gauges
+
+
+def timed(collection, preprocessors):
+    """
+    Wraps each of the flask-restless `preprocessors` so the time spent
+    in it is observed, labelled with the collection, method and name of
+    the preprocessor.
+    """
+    def wrap(method, preprocessor):
+        labels = (('collection', collection), ('method', method),
+                  ('preprocessor', preprocessor.__name__))
+
+        @wraps(preprocessor)
+        def timed_preprocessor(*args, **kwargs):
+            started = default_timer()
+            try:
+                return preprocessor(*args, **kwargs)
+            finally:
+                current_app.extensions['metrics'].observe(
+                    'preprocessor_duration_seconds', labels,
+                    default_timer() - started)
+        return timed_preprocessor
+
+    return dict((method, [wrap(method, preprocessor)
+                          for preprocessor in chain])
+                for method, chain in preprocessors.items())
+
+
+def start_timer():
+    g.metrics_started = default_timer()
+
+
+def record(status):
+    if 'metrics_started' not in g or request.endpoint == 'metrics.serve':
+        return
+    collector = current_app.extensions['metrics']
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    collector.observe(
+        'http_request_duration_seconds',
+        (('route', route), ('method', request.method)),
+        default_timer() - g.pop('metrics_started'))
+    collector.count('http_requests_total', (
+        ('route', route), ('method', request.method),
+        ('status', str(status))))
+    if status >= 400:
+        collector.count('http_errors_total', (('status', str(status)),))
+    if collector.due():
+        collector.flush(worker_gauges(collector))
+
+
+def record_response(response):
+    record(response.status_code)
+    return response
+
+
+def record_exception(exc):
+    # only unhandled exceptions skip after_request
+    if exc is not None:
+        record(500)
+
+
+def metrics_handler(app):
+    app.before_request(start_timer)
+    app.after_request(record_response)
+    app.teardown_request(record_exception)
+
+
+@metrics.route('/metrics', methods=['GET'])
+def serve():
+    token = current_app.config['METRICS_TOKEN']
+    if token and request.headers.get('Authorization') != 'Bearer ' + token:
+        return jsonify({'message': 'A valid metrics token is required'}), 401
+    collector = current_app.extensions['metrics']
+    return Response(collector.render(worker_gauges(collector)),
+                    mimetype='text/plain; version=0.0.4')
@@ -1,8 +1,9 @@
 import json
 from app import db
-from datetime import date
-from passlib.hash import bcrypt
-from sqlalchemy import cast, DATE
+from datetime import date, datetime
+from app.passwords import hash_password, verify_password
+from sqlalchemy import cast, event, DATE, DDL
+from sqlalchemy.orm import configure_mappers, joinedload, selectinload
 
 
 class UserType:
@@ -16,13 +17,22 @@ class MenuType:
     SUPPER = 3
 
 
+# blacklist tokens of this form record that a user's role changed
+CLAIMS_PREFIX = 'claims:'
+
+
 class Blacklist(db.Model):
 
     __tablename__ = 'blacklist'
+    __table_args__ = (
+        db.Index('ix_blacklist_token', 'token'),
+        db.Index('ix_blacklist_created_at', 'created_at'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     token = db.Column(db.String(500))
-    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+    # in UTC whatever the database's time zone, RevokedTokens reads it so
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     def __init__(self, token):
         self.token = token
@@ -52,7 +62,7 @@ class User(db.Model):
         self.email = email
         self.role = role
         self.username = username
-        self.password_hash = bcrypt.encrypt(password)
+        self.password_hash = hash_password(password)
 
     def save(self):
         db.session.add(self)
@@ -67,7 +77,13 @@ class User(db.Model):
         db.session.commit()
 
     def validate_password(self, password):
-        return bcrypt.verify(password, self.password_hash)
+        valid, new_hash = verify_password(password, self.password_hash)
+        if valid and new_hash:
+            # made with outdated settings, upgrade it while we have the
+            # password at hand
+            self.password_hash = new_hash
+            self.save()
+        return valid
 
     def is_caterer(self):
         return self.role == UserType.CATERER
@@ -80,9 +96,33 @@ class User(db.Model):
         })
 
 
+# on PostgreSQL the database records role changes itself, so changes made
+# outside the app revoke tokens too
+REVOKE_CLAIMS = [DDL("""
+CREATE OR REPLACE FUNCTION revoke_claims_on_role_change() RETURNS trigger
+AS $$
+BEGIN
+    INSERT INTO blacklist (token, created_at)
+    VALUES ('claims:' || NEW.id, clock_timestamp() AT TIME ZONE 'utc');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql
+"""), DDL("""
+CREATE TRIGGER users_role_change AFTER UPDATE OF role ON users
+FOR EACH ROW WHEN (OLD.role IS DISTINCT FROM NEW.role)
+EXECUTE PROCEDURE revoke_claims_on_role_change()
+""")]
+for ddl in REVOKE_CLAIMS:
+    event.listen(User.__table__, 'after_create',
+                 ddl.execute_if(dialect='postgresql'))
+
+
 class Menu(db.Model):
 
     __tablename__ = 'menus'
+    __table_args__ = (
+        db.Index('ix_menus_day', 'day'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     category = db.Column(db.Integer)
@@ -113,6 +153,12 @@ class Menu(db.Model):
 class MenuItem(db.Model):
 
     __tablename__ = 'menu_items'
+    __table_args__ = (
+        # a meal appears at most once on a menu; this also serves menu_id
+        db.Index('ix_menu_items_menu_id_meal_id', 'menu_id', 'meal_id',
+                 unique=True),
+        db.Index('ix_menu_items_meal_id', 'meal_id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     menu_id = db.Column(db.Integer, db.ForeignKey('menus.id'))
@@ -126,12 +172,12 @@ class MenuItem(db.Model):
 
     menu = db.relationship(
         'Menu',
-        backref=db.backref('menu_items', lazy='dynamic')
+        backref='menu_items'
     )
 
     meal = db.relationship(
         'Meal',
-        backref=db.backref('menu_items', lazy='dynamic')
+        backref='menu_items'
     )
 
     def __init__(self, menu_id, meal_id):
@@ -187,6 +233,13 @@ class Meal(db.Model):
 class Order(db.Model):
 
     __tablename__ = 'orders'
+    __table_args__ = (
+        # these also serve keyset pagination by (created_at, id)
+        db.Index('ix_orders_user_id_created_at', 'user_id', 'created_at',
+                 'id'),
+        db.Index('ix_orders_created_at', 'created_at', 'id'),
+        db.Index('ix_orders_menu_item_id', 'menu_item_id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     quantity = db.Column(db.Integer, default=1)
@@ -205,7 +258,7 @@ class Order(db.Model):
 
     menu_item = db.relationship(
         'MenuItem',
-        backref=db.backref("orders", lazy="dynamic")
+        backref='orders'
     )
 
     def __init__(self, menu_item_id, user_id, quantity):
@@ -229,6 +282,11 @@ class Order(db.Model):
 class Notification(db.Model):
 
     __tablename__ = 'notifications'
+    __table_args__ = (
+        db.Index('ix_notifications_user_id_created_at', 'user_id',
+                 'created_at', 'id'),
+        db.Index('ix_notifications_created_at', 'created_at', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(255))
@@ -244,7 +302,7 @@ class Notification(db.Model):
 
     user = db.relationship(
         'User',
-        backref=db.backref("notifications", lazy="dynamic")
+        backref='notifications'
     )
 
     def __init__(self, title, message, user_id):
@@ -263,3 +321,47 @@ class Notification(db.Model):
     def delete(self):
         db.session.delete(self)
         db.session.commit()
+
+
+
+class DailyOrders(db.Model):
+    """
+    How many orders, and plates in them, each menu item got on each day.
+
+    It is kept up to date as orders are written (see app/reports.py) so
+    reports read a row per menu item per day instead of every order.
+    """
+
+    __tablename__ = 'daily_orders'
+    __table_args__ = (
+        db.Index('ix_daily_orders_day_menu_item_id', 'day', 'menu_item_id',
+                 unique=True),
+        db.Index('ix_daily_orders_menu_item_id', 'menu_item_id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    menu_item_id = db.Column(
+        db.Integer,
+        db.ForeignKey('menu_items.id', ondelete='CASCADE'),
+        nullable=False
+    )
+    orders = db.Column(db.Integer, nullable=False, default=0)
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+
+# the backrefs above only exist once the mappers are configured
+configure_mappers()
+
+
+# How each model's relations are loaded when it is serialized, so that a
+# page of results costs the same number of queries however long it is.
+# Many-to-one relations are joined, collections take one more query.
+serialize_loads = {
+    Meal: [selectinload(Meal.menu_items)],
+    Menu: [selectinload(Menu.menu_items)],
+    MenuItem: [joinedload(MenuItem.menu), joinedload(MenuItem.meal),
+               selectinload(MenuItem.orders)],
+    Order: [joinedload(Order.menu_item)],
+    Notification: [joinedload(Notification.user)],
+    User: [selectinload(User.notifications)],
+}
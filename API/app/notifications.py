@@ -0,0 +1,66 @@
+import time
+from app import db
+from app.models import Notification, User, UserType, Order, MenuItem
+from app.auth import caterer_auth
+from app.validators import Valid
+from flask import Blueprint, request, jsonify
+from flask_restless import ProcessingException
+
+
+notifications = Blueprint('notifications', __name__)
+
+
+def recipients(audience, menu_id=None):
+    """ Returns a query for the ids of the users in this audience """
+    if audience == 'customers':
+        return db.session.query(User.id).filter(
+            User.role == UserType.CUSTOMER)
+    if audience == 'menu':
+        return db.session.query(Order.user_id).distinct().join(
+            MenuItem, Order.menu_item_id == MenuItem.id).filter(
+            MenuItem.menu_id == menu_id)
+    return db.session.query(User.id)
+
+
+def broadcast(title, message, audience, menu_id=None):
+    """
+    Sends a notification to every user in the audience with a single
+    INSERT ... SELECT and returns how many were sent.
+    """
+    user_ids = recipients(audience, menu_id).subquery()
+    insert = Notification.__table__.insert().from_select(
+        ['title', 'message', 'user_id', 'created_at', 'updated_at'],
+        db.select([
+            db.literal(title), db.literal(message),
+            list(user_ids.c)[0],
+            db.func.current_timestamp().label('created_at'),
+            db.func.current_timestamp().label('updated_at')
+        ])
+    )
+    result = db.session.execute(insert)
+    db.session.commit()
+    return result.rowcount
+
+
+@notifications.route('/api/v1/notifications/broadcast', methods=['POST'])
+def post_broadcast():
+    """
+    Notifies all users, all customers or everyone who ordered from a
+    menu at once.
+    """
+    caterer_auth()
+    if not request.is_json:
+        return jsonify({'message': 'Request should be JSON'}), 400
+
+    try:
+        Valid.post_broadcast()
+    except ProcessingException as err:
+        return jsonify({'message': err.description}), err.code
+
+    started = time.time()
+    sent = broadcast(request.json['title'], request.json['message'],
+                     request.json['audience'], request.json.get('menu_id'))
+    return jsonify({
+        'recipients': sent,
+        'seconds': round(time.time() - started, 3)
+    }), 201
@@ -0,0 +1,163 @@
+import io
+import csv
+import zlib
+import six
+from datetime import timedelta
+from app import db
+from app.auth import caterer_auth
+from app.models import Order, User, MenuItem, Meal, Menu, serialize_loads
+from app.reports import date_range
+from app.validators import Valid
+from flask import (
+    Blueprint, request, jsonify, current_app, Response, stream_with_context
+)
+from flask_restless import ProcessingException
+from flask_jwt_extended import jwt_required
+from sqlalchemy.exc import IntegrityError
+
+
+orders = Blueprint('orders', __name__)
+
+
+@orders.route('/api/v1/orders/batch', methods=['POST'])
+@jwt_required
+def post_batch():
+    """
+    Places several orders at once. Either all of them are placed or, if
+    any is invalid, none is.
+    """
+    if not request.is_json:
+        return jsonify({'message': 'Request should be JSON'}), 400
+
+    try:
+        valid_orders = Valid.post_orders()
+    except ProcessingException as err:
+        if isinstance(err.description, list):
+            return jsonify({'errors': err.description}), err.code
+        return jsonify({'message': err.description}), err.code
+
+    placed = [Order(**fields) for fields in valid_orders]
+    try:
+        db.session.add_all(placed)
+        db.session.flush()
+        ids = [order.id for order in placed]
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'message': 'Orders could not be processed'}), 400
+
+    # read back in one query with what the serializer sends along
+    serialize = current_app.extensions['serializers'][Order]
+    placed = Order.query.options(*serialize_loads[Order]) \
+        .filter(Order.id.in_(ids)) \
+        .order_by(Order.id).all()
+    return jsonify({
+        'num_results': len(placed),
+        'objects': [serialize(order) for order in placed]
+    }), 201
+
+
+EXPORT_COLUMNS = [
+    Order.id, Order.created_at, Order.quantity, User.id, User.username,
+    User.email, Menu.id, Menu.day, Menu.category, Meal.id, Meal.name,
+    Meal.cost,
+]
+EXPORT_HEADER = [
+    'order_id', 'created_at', 'quantity', 'user_id', 'username', 'email',
+    'menu_id', 'menu_day', 'menu_category', 'meal_id', 'meal_name',
+    'meal_cost', 'total',
+]
+
+
+def export_rows(start, end, chunk_size=500):
+    """
+    Yields the orders placed from day `start` to day `end`, both
+    included, with their user, menu and meal, in the order they were
+    placed. Rows are read `chunk_size` at a time from a server-side
+    cursor where the database driver has one.
+    """
+    query = db.session.query(*EXPORT_COLUMNS) \
+        .join(User, User.id == Order.user_id) \
+        .join(MenuItem, MenuItem.id == Order.menu_item_id) \
+        .join(Meal, Meal.id == MenuItem.meal_id) \
+        .join(Menu, Menu.id == MenuItem.menu_id) \
+        .filter(Order.created_at >= start,
+                Order.created_at < end + timedelta(days=1)) \
+        .order_by(Order.created_at, Order.id)
+    result = db.session.connection() \
+        .execution_options(stream_results=True) \
+        .execute(query.with_labels().statement)
+    try:
+        while True:
+            rows = result.fetchmany(chunk_size)
+            if not rows:
+                break
+            for row in rows:
+                yield row
+    finally:
+        result.close()
+
+
+def write_csv(rows):
+    """ Yields the CSV text of the export, a line at a time """
+    # the Python 2 csv module only writes byte strings
+    buffer = io.StringIO() if six.PY3 else io.BytesIO()
+    writer = csv.writer(buffer)
+
+    def line(row):
+        if six.PY2:
+            row = [value.encode('utf-8')
+                   if isinstance(value, six.text_type) else value
+                   for value in row]
+        writer.writerow(row)
+        text = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return text if six.PY3 else text.decode('utf-8')
+
+    yield line(EXPORT_HEADER)
+    for row in rows:
+        row = list(row)
+        row.append((row[2] or 0) * (row[11] or 0))
+        yield line(row)
+
+
+def gzipped(chunks):
+    """ Compresses text chunks into a gzip stream as they come """
+    compressor = zlib.compressobj(9, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+@orders.route('/api/v1/orders/export', methods=['GET'])
+def export():
+    """
+    Downloads the orders placed between the `from` and `to` days as CSV,
+    gzipped with gzip=true, written as the rows are read.
+    """
+    caterer_auth()
+    try:
+        start, end = date_range()
+    except ValueError:
+        return jsonify({
+            'message': 'from and to should be days like 2018-05-01, in order'
+        }), 400
+
+    chunks = write_csv(export_rows(
+        start, end, current_app.config['STREAM_YIELD_PER']))
+    filename = 'orders-{}-{}.csv'.format(start, end)
+    mimetype = 'text/csv'
+    if request.args.get('gzip') == 'true':
+        chunks = gzipped(chunks)
+        filename += '.gz'
+        mimetype = 'application/gzip'
+    return Response(
+        stream_with_context(chunks),
+        mimetype=mimetype,
+        headers={
+            'Content-Disposition': 'attachment; filename=' + filename
+        }
+    )
@@ -0,0 +1,188 @@
+import math
+import base64
+from dateutil import parser
+from flask import (
+    request, abort, jsonify, make_response, current_app, json, Response,
+    stream_with_context
+)
+from flask_restless.search import create_query, search
+from flask_restless.helpers import count, strings_to_dates
+from flask_restless.views import create_link_string
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Query
+from sqlalchemy.orm.exc import NoResultFound, MultipleResultsFound
+from app import db
+
+
+DEFAULT_PER_PAGE = 10
+MAX_PER_PAGE = 100
+
+
+def bad_request(message):
+    abort(make_response(jsonify({'message': message}), 400))
+
+
+def results_per_page():
+    try:
+        per_page = int(request.args.get('results_per_page'))
+    except (TypeError, ValueError):
+        per_page = DEFAULT_PER_PAGE
+    if per_page <= 0:
+        per_page = DEFAULT_PER_PAGE
+    return min(per_page, MAX_PER_PAGE)
+
+
+def encode_cursor(instance):
+    position = [instance.created_at.isoformat(), instance.id]
+    return base64.urlsafe_b64encode(
+        json.dumps(position).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    try:
+        created_at, id = json.loads(
+            base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+        return parser.parse(created_at), int(id)
+    except Exception:
+        bad_request('Invalid cursor')
+
+
+def keyset(model):
+    """
+    This returns a flask-restless preprocessor that pages through the
+    collection newest first by (created_at, id) when the request has a
+    `cursor` parameter. Pass an empty cursor for the first page and the
+    `next` cursor of each response for the page after it.
+
+    Unlike page numbers, a cursor costs the same at any depth and rows
+    inserted in the meantime do not shift the pages.
+    """
+    def pre_keyset(search_params=None, **kwargs):
+        if 'cursor' not in request.args:
+            return
+
+        per_page = results_per_page()
+        query = create_query(db.session, model,
+                             {'filters': search_params.get('filters', [])},
+                             _ignore_order_by=True)
+        if request.args['cursor']:
+            created_at, id = decode_cursor(request.args['cursor'])
+            # compare against the stored value when the row still exists so
+            # the database never has to compare its own format with ours
+            anchor = db.func.coalesce(db.session.query(model.created_at)
+                                      .filter(model.id == id).as_scalar(),
+                                      created_at)
+            query = query.filter(
+                tuple_(model.created_at, model.id) < tuple_(anchor, id))
+        rows = query.order_by(model.created_at.desc(), model.id.desc()) \
+            .limit(per_page + 1).all()
+
+        serialize = current_app.extensions['serializers'][model]
+        page = rows[:per_page]
+        abort(jsonify({
+            'num_results': len(page),
+            'objects': [serialize(row) for row in page],
+            'next': encode_cursor(page[-1]) if len(rows) > per_page else None
+        }))
+    return pre_keyset
+
+
+def streamed(model):
+    """
+    This returns a flask-restless preprocessor that, when the request has
+    `stream=true`, sends every row of the search as it is read instead of
+    a page of them, so memory stays flat however many rows there are.
+
+    Rows are read STREAM_YIELD_PER at a time from a server-side cursor.
+    The response is {"objects": [...], "num_results": n}.
+    """
+    def pre_streamed(search_params=None, **kwargs):
+        if request.args.get('stream') != 'true':
+            return
+
+        serialize = current_app.extensions['serializers'][model]
+        try:
+            with_dates(model, search_params)
+            query = create_query(db.session, model, search_params)
+        except Exception:
+            bad_request('Unable to construct query')
+        rows = query.yield_per(current_app.config['STREAM_YIELD_PER'])
+
+        def generate():
+            yield '{"objects": ['
+            num_results = 0
+            for row in rows:
+                if num_results:
+                    yield ', '
+                yield json.dumps(serialize(row))
+                num_results += 1
+            yield '], "num_results": {}}}'.format(num_results)
+
+        abort(Response(stream_with_context(generate()),
+                       mimetype='application/json'))
+    return pre_streamed
+
+
+def with_dates(model, search_params):
+    """
+    Turns the date strings in the filters into dates, as flask-restless
+    does before searching.
+    """
+    for param in search_params.get('filters', []):
+        if 'name' not in param or 'val' not in param:
+            continue
+        query_model, field = model, param['name']
+        if '__' in field:
+            relation, field = field.split('__')
+            query_model = getattr(model, relation).property.mapper.class_
+        param['val'] = strings_to_dates(
+            query_model, {field: param['val']}).get(field)
+
+
+def paged(model):
+    """
+    This returns a flask-restless preprocessor that answers a search the
+    way flask-restless would, with the same page numbers, Link header and
+    `single` results, but serializes the rows with the model's
+    precompiled serializer.
+
+    It has to come last, any preprocessor after it would not run.
+    """
+    def pre_paged(search_params=None, **kwargs):
+        serialize = current_app.extensions['serializers'][model]
+        try:
+            with_dates(model, search_params)
+            result = search(db.session, model, search_params)
+        except NoResultFound:
+            abort(make_response(
+                jsonify({'message': 'No result found'}), 404))
+        except MultipleResultsFound:
+            bad_request('Multiple results found')
+        except Exception:
+            bad_request('Unable to construct query')
+
+        if not isinstance(result, Query):
+            response = jsonify(serialize(result))
+            response.headers['Location'] = '{}/{}'.format(
+                request.base_url, result.id)
+            abort(response)
+
+        per_page = results_per_page()
+        try:
+            page = max(int(request.args.get('page', 1)), 1)
+        except ValueError:
+            page = 1
+        num_results = count(db.session, result)
+        total_pages = int(math.ceil(num_results / float(per_page)))
+        rows = result.limit(per_page).offset((page - 1) * per_page)
+
+        response = jsonify({
+            'page': page,
+            'total_pages': total_pages,
+            'num_results': num_results,
+            'objects': [serialize(row) for row in rows],
+        })
+        response.headers['Link'] = create_link_string(
+            page, total_pages, per_page)
+        abort(response)
+    return pre_paged
@@ -0,0 +1,185 @@
+import time
+import threading
+import multiprocessing
+from flask import current_app, has_app_context
+from passlib.context import CryptContext
+
+
+DEFAULT_SETTINGS = ('bcrypt', 12)
+
+# (scheme, rounds) -> the passlib context hashing with them
+contexts = {}
+
+
+class PasswordPoolBusy(Exception):
+    """ Raised when too many passwords are already waiting to be hashed """
+    pass
+
+
+def crypt_context(settings):
+    """
+    Returns a passlib context hashing with the (scheme, rounds) settings.
+    It still verifies bcrypt hashes but marks them, and hashes of other
+    rounds, as needing an update.
+    """
+    context = contexts.get(settings)
+    if context is None:
+        scheme, rounds = settings
+        schemes = [scheme] + (['bcrypt'] if scheme != 'bcrypt' else [])
+        context = contexts[settings] = CryptContext(
+            schemes=schemes, deprecated='auto',
+            **{scheme + '__rounds': rounds})
+    return context
+
+
+def hash_in_worker(settings, password):
+    started = time.time()
+    password_hash = crypt_context(settings).hash(password)
+    return password_hash, started, time.time() - started
+
+
+def verify_in_worker(settings, password, password_hash):
+    started = time.time()
+    result = crypt_context(settings).verify_and_update(password, password_hash)
+    return result, started, time.time() - started
+
+
+class PasswordHasher:
+    """
+    Hashes and verifies passwords in a pool of PASSWORD_POOL_SIZE processes
+    so bcrypt does not hold up the workers serving requests. The pool is
+    shared by the threads of a worker, see the Procfile, and started by
+    gunicorn.conf.py before they are, since forking a process with threads
+    running can leave the child stuck on a lock one of them held.
+
+    At most PASSWORD_QUEUE_LIMIT passwords wait for a free process, the
+    ones after them are turned away with PasswordPoolBusy straight away,
+    as are the ones not done within PASSWORD_TIMEOUT seconds.
+    With a pool size of 0 passwords are hashed in the calling thread.
+    """
+
+    def __init__(self, app=None):
+        self.pool = None
+        self.pending = 0
+        self.lock = threading.Lock()
+        self.hashed = 0
+        self.rejected = 0
+        self.queue_wait = 0.0
+        self.max_queue_wait = 0.0
+        self.hash_time = 0.0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.settings = (app.config['PASSWORD_SCHEME'],
+                         app.config['PASSWORD_ROUNDS'])
+        self.size = app.config['PASSWORD_POOL_SIZE']
+        self.queue_limit = app.config['PASSWORD_QUEUE_LIMIT']
+        self.timeout = app.config['PASSWORD_TIMEOUT']
+        app.extensions['passwords'] = self
+
+    def start(self):
+        """ Starts the pool unless it is running or there is none """
+        with self.lock:
+            if self.size and self.pool is None:
+                self.pool = multiprocessing.Pool(self.size)
+
+    def run(self, function, *args):
+        if not self.size:
+            submitted = time.time()
+            result, started, seconds = function(*args)
+            self.record(started - submitted, seconds)
+            return result
+
+        with self.lock:
+            if self.pending >= self.size + self.queue_limit:
+                self.rejected += 1
+                raise PasswordPoolBusy('Too many logins at once, '
+                                       'please try again shortly')
+            self.pending += 1
+        try:
+            # only started here outside gunicorn, see gunicorn.conf.py
+            self.start()
+            submitted = time.time()
+            try:
+                result, started, seconds = \
+                    self.pool.apply_async(function, args).get(self.timeout)
+            except multiprocessing.TimeoutError:
+                with self.lock:
+                    self.rejected += 1
+                raise PasswordPoolBusy('Passwords are taking too long, '
+                                       'please try again shortly')
+            self.record(started - submitted, seconds)
+            return result
+        finally:
+            with self.lock:
+                self.pending -= 1
+
+    def record(self, queue_wait, seconds):
+        with self.lock:
+            self.hashed += 1
+            self.queue_wait += max(queue_wait, 0)
+            self.max_queue_wait = max(self.max_queue_wait, queue_wait)
+            self.hash_time += seconds
+
+    def hash(self, password):
+        return self.run(hash_in_worker, self.settings, password)
+
+    def verify(self, password, password_hash):
+        """
+        Returns whether the password matches and, when the hash was made
+        with other settings, a new hash of it to store, otherwise None.
+        """
+        return self.run(verify_in_worker, self.settings, password,
+                        password_hash)
+
+    def stats(self):
+        hashed = max(self.hashed, 1)
+        return {
+            'pool_size': self.size,
+            'pending': self.pending,
+            'hashed': self.hashed,
+            'rejected': self.rejected,
+            'average_queue_wait': round(self.queue_wait / hashed, 6),
+            'max_queue_wait': round(self.max_queue_wait, 6),
+            'average_hash_time': round(self.hash_time / hashed, 6),
+        }
+
+
+def hasher():
+    if has_app_context() and 'passwords' in current_app.extensions:
+        return current_app.extensions['passwords']
+    return None
+
+
+def hash_password(password):
+    passwords = hasher()
+    if passwords is None:
+        return crypt_context(DEFAULT_SETTINGS).hash(password)
+    return passwords.hash(password)
+
+
+def verify_password(password, password_hash):
+    """ Returns whether it matches and a new hash when one is due """
+    passwords = hasher()
+    if passwords is None:
+        return crypt_context(DEFAULT_SETTINGS).verify_and_update(
+            password, password_hash)
+    return passwords.verify(password, password_hash)
+
+
+def benchmark(scheme, rounds, seconds=1.0):
+    """
+    Hashes for about `seconds` at each of the `rounds` and returns how
+    many hashes per second each managed.
+    """
+    rates = []
+    for value in rounds:
+        context = crypt_context((scheme, value))
+        hashes = 0
+        started = time.time()
+        while time.time() - started < seconds:
+            context.hash('benchmark')
+            hashes += 1
+        rates.append((value, hashes / (time.time() - started)))
+    return rates
@@ -0,0 +1,249 @@
+from datetime import datetime
+from flask import Blueprint, request, jsonify
+from sqlalchemy import event, inspect, and_
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import Session
+from app import db
+from app.auth import caterer_auth
+from app.models import DailyOrders, Order, MenuItem, Menu, Meal
+
+
+reports = Blueprint('reports', __name__)
+
+rollups = DailyOrders.__table__
+orders = Order.__table__
+
+
+def order_day():
+    return db.func.date(orders.c.created_at, type_=db.Date)
+
+
+def rollup_key(connection, order_id):
+    """ Returns the day, menu item and quantity of an order as stored """
+    return connection.execute(
+        db.select([order_day(), orders.c.menu_item_id, orders.c.quantity])
+        .where(orders.c.id == order_id)
+    ).first()
+
+
+def add_to_rollup(connection, key, sign):
+    """
+    Counts an order in, or with a negative `sign` out of, the rollup row
+    of its day and menu item.
+
+    Two transactions may count the first order of a day and menu item at
+    once. PostgreSQL adds to the row the other one inserted in a single
+    statement, SQLite ignores the insert when the row turns out to be
+    there and updates it instead.
+    """
+    if key is None or key[1] is None:
+        return
+    day, menu_item_id, quantity = key
+    values = {'day': day, 'menu_item_id': menu_item_id, 'orders': 1,
+              'quantity': quantity or 0}
+    if sign > 0 and connection.dialect.name == 'postgresql':
+        insert = postgresql.insert(rollups).values(**values)
+        connection.execute(insert.on_conflict_do_update(
+            index_elements=[rollups.c.day, rollups.c.menu_item_id],
+            set_={'orders': rollups.c.orders + 1,
+                  'quantity': rollups.c.quantity + insert.excluded.quantity}
+        ))
+        return
+
+    where = and_(rollups.c.day == day, rollups.c.menu_item_id == menu_item_id)
+    update = rollups.update().where(where).values(
+        orders=rollups.c.orders + sign,
+        quantity=rollups.c.quantity + sign * (quantity or 0)
+    )
+    updated = connection.execute(update)
+    if not updated.rowcount and sign > 0:
+        inserted = connection.execute(rollups.insert().values(**values)
+                                      .prefix_with('OR IGNORE',
+                                                   dialect='sqlite'))
+        if not inserted.rowcount:
+            connection.execute(update)
+    elif sign < 0:
+        connection.execute(rollups.delete().where(
+            and_(where, rollups.c.orders <= 0)))
+
+
+def rebuild_rollups(connection, keys=None):
+    """
+    Recomputes the rollup rows of the given (day, menu item) pairs, or
+    every rollup row, from the orders table.
+    """
+    if keys is None:
+        connection.execute(rollups.delete())
+        counted = orders.c.menu_item_id.isnot(None)
+    else:
+        keys = [(day, menu_item_id) for day, menu_item_id in keys
+                if menu_item_id is not None]
+        if not keys:
+            return
+        connection.execute(rollups.delete().where(db.or_(*[
+            and_(rollups.c.day == day, rollups.c.menu_item_id == menu_item_id)
+            for day, menu_item_id in keys])))
+        counted = db.or_(*[
+            and_(order_day() == day, orders.c.menu_item_id == menu_item_id)
+            for day, menu_item_id in keys])
+    connection.execute(rollups.insert().from_select(
+        ['day', 'menu_item_id', 'orders', 'quantity'],
+        db.select([
+            order_day().label('day'),
+            orders.c.menu_item_id,
+            db.func.count(orders.c.id),
+            db.func.coalesce(db.func.sum(orders.c.quantity), 0),
+        ]).where(counted)
+        .group_by(order_day(), orders.c.menu_item_id)
+    ))
+
+
+def bulk_write_orders(query, write):
+    """
+    Runs `write(query)`, a bulk update or delete of the orders in `query`,
+    and then recounts the rollups of the days and menu items those orders
+    had before and have after it. Returns what `write` returns.
+    """
+    session = query.session
+    before = query.with_entities(
+        orders.c.id, order_day(), orders.c.menu_item_id).all()
+    session.info['recounting_orders'] = True
+    try:
+        result = write(query)
+    finally:
+        session.info.pop('recounting_orders')
+
+    keys = set((day, menu_item_id) for _, day, menu_item_id in before)
+    ids = [id for id, _, _ in before]
+    if ids:
+        keys.update(session.query(order_day(), orders.c.menu_item_id)
+                    .filter(orders.c.id.in_(ids)).distinct())
+    rebuild_rollups(session.connection(), keys)
+    return result
+
+
+def update_orders(query, values, **kwargs):
+    """ Query.update for orders that keeps the rollups counted """
+    return bulk_write_orders(
+        query, lambda query: query.update(values, **kwargs))
+
+
+def delete_orders(query, **kwargs):
+    """ Query.delete for orders that keeps the rollups counted """
+    return bulk_write_orders(query, lambda query: query.delete(**kwargs))
+
+
+def changes_rollup(target):
+    state = inspect(target)
+    return state.attrs.quantity.history.has_changes() or \
+        state.attrs.menu_item_id.history.has_changes()
+
+
+@event.listens_for(Order, 'after_insert')
+def count_order(mapper, connection, target):
+    add_to_rollup(connection, rollup_key(connection, target.id), 1)
+
+
+@event.listens_for(Order, 'before_update')
+def uncount_updated_order(mapper, connection, target):
+    if changes_rollup(target):
+        add_to_rollup(connection, rollup_key(connection, target.id), -1)
+
+
+@event.listens_for(Order, 'after_update')
+def count_updated_order(mapper, connection, target):
+    if changes_rollup(target):
+        add_to_rollup(connection, rollup_key(connection, target.id), 1)
+
+
+@event.listens_for(Order, 'before_delete')
+def uncount_order(mapper, connection, target):
+    add_to_rollup(connection, rollup_key(connection, target.id), -1)
+
+
+@event.listens_for(Session, 'after_bulk_update')
+@event.listens_for(Session, 'after_bulk_delete')
+def refuse_uncounted_orders(context):
+    # the rows are already written, so there is no telling what changed
+    if context.mapper.class_ is Order and \
+            not context.session.info.get('recounting_orders'):
+        raise RuntimeError('Bulk writes to orders have to go through '
+                           'update_orders or delete_orders')
+
+
+def date_range():
+    """
+    Returns the `from` and `to` days of the request, both today by
+    default, or raises ValueError.
+    """
+    today = datetime.utcnow().date()
+    start, end = [
+        datetime.strptime(request.args[name], '%Y-%m-%d').date()
+        if request.args.get(name) else today
+        for name in ('from', 'to')
+    ]
+    if start > end:
+        raise ValueError
+    return start, end
+
+
+def report(*columns):
+    """
+    Sums the orders, plates and revenue of the rollup rows in the
+    requested days, grouped by `columns`.
+    """
+    caterer_auth()
+    try:
+        start, end = date_range()
+    except ValueError:
+        return jsonify({
+            'message': 'from and to should be days like 2018-05-01, in order'
+        }), 400
+
+    revenue = db.func.sum(DailyOrders.quantity * Meal.cost)
+    rows = db.session.query(
+        *columns + (
+            db.func.sum(DailyOrders.orders),
+            db.func.sum(DailyOrders.quantity),
+            revenue,
+        )
+    ).select_from(DailyOrders) \
+        .join(MenuItem, MenuItem.id == DailyOrders.menu_item_id) \
+        .join(Meal, Meal.id == MenuItem.meal_id) \
+        .join(Menu, Menu.id == MenuItem.menu_id) \
+        .filter(DailyOrders.day.between(start, end)) \
+        .group_by(*columns).order_by(*columns).all()
+
+    names = [column.key for column in columns] + \
+        ['orders', 'quantity', 'revenue']
+    objects = []
+    for row in rows:
+        result = dict(zip(names, row))
+        result['revenue'] = float(result['revenue'] or 0)
+        if 'day' in result:
+            result['day'] = result['day'].isoformat()
+        objects.append(result)
+    return jsonify({
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'num_results': len(objects),
+        'objects': objects,
+    }), 200
+
+
+@reports.route('/api/v1/reports/meals', methods=['GET'])
+def meals_report():
+    """ Orders, plates and revenue of each meal """
+    return report(Meal.id.label('meal_id'), Meal.name)
+
+
+@reports.route('/api/v1/reports/categories', methods=['GET'])
+def categories_report():
+    """ Orders, plates and revenue of each menu category """
+    return report(Menu.category)
+
+
+@reports.route('/api/v1/reports/revenue', methods=['GET'])
+def revenue_report():
+    """ Orders, plates and revenue of each day """
+    return report(DailyOrders.day)
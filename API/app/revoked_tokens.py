@@ -0,0 +1,100 @@
+import time
+import threading
+from calendar import timegm
+from datetime import datetime, timedelta
+from app.models import Blacklist, CLAIMS_PREFIX
+
+
+def timestamp(created_at):
+    return timegm(created_at.utctimetuple()) + created_at.microsecond / 1e6
+
+
+class RevokedTokens:
+    """
+    In-memory set of revoked token ids (jti) backed by the blacklist table.
+
+    Membership checks are dictionary lookups. The table is only read when
+    the set is first used and then every REVOKED_TOKENS_REFRESH seconds,
+    picking up rows written by other workers since the last read. Rows
+    are read by when they were stamped, going back COMMIT_MARGIN before
+    the last read, since ids and stamps do not commit in order. Entries
+    are dropped once the token they revoke would have expired anyway.
+
+    Rows whose token is `claims:<user id>` record when that user's role
+    changed instead, revoking every token they were issued before then.
+    """
+
+    # how much later than they were stamped rows may still commit
+    COMMIT_MARGIN = timedelta(seconds=60)
+
+    def __init__(self, app=None):
+        self.tokens = {}
+        # user id -> when the claims of their tokens last changed
+        self.claims = {}
+        # UTC time of the last read of the table
+        self.read_at = None
+        self.last_refresh = 0
+        # taken by refresh too, which records the claims it reads
+        self.lock = threading.RLock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.expires = app.config['JWT_ACCESS_TOKEN_EXPIRES']
+        self.refresh_interval = app.config['REVOKED_TOKENS_REFRESH']
+        app.extensions['revoked_tokens'] = self
+
+    def add(self, jti, expires_at):
+        """ Records a token revoked by this worker """
+        with self.lock:
+            self.tokens[jti] = expires_at
+
+    def claims_changed(self, user_id, changed_at):
+        """ Records a role change seen by this worker """
+        with self.lock:
+            self.claims[user_id] = max(self.claims.get(user_id, 0),
+                                       changed_at)
+
+    def refresh_if_due(self):
+        if time.time() - self.last_refresh >= self.refresh_interval:
+            self.refresh()
+
+    def __contains__(self, jti):
+        self.refresh_if_due()
+        expires_at = self.tokens.get(jti)
+        return expires_at is not None and expires_at > time.time()
+
+    def claims_changed_at(self, user_id):
+        """ When the user's role last changed, None if not lately """
+        self.refresh_if_due()
+        return self.claims.get(user_id)
+
+    def refresh(self):
+        with self.lock:
+            now = time.time()
+            read_at = datetime.utcnow()
+            if self.read_at is None:
+                # tokens revoked before then have expired by now
+                since = read_at - self.expires
+            else:
+                since = self.read_at - self.COMMIT_MARGIN
+            query = Blacklist.query \
+                .with_entities(Blacklist.token, Blacklist.created_at) \
+                .filter(Blacklist.created_at >= since)
+
+            for token, created_at in query:
+                if token.startswith(CLAIMS_PREFIX):
+                    self.claims_changed(int(token[len(CLAIMS_PREFIX):]),
+                                        timestamp(created_at))
+                else:
+                    self.tokens[token] = timestamp(
+                        created_at + self.expires)
+            self.read_at = read_at
+
+            self.tokens = dict((jti, expires_at) for jti, expires_at
+                               in self.tokens.items() if expires_at > now)
+            # tokens issued before the change have expired by now
+            oldest = now - self.expires.total_seconds()
+            self.claims = dict((user_id, changed_at) for user_id, changed_at
+                               in self.claims.items() if changed_at > oldest)
+            self.last_refresh = now
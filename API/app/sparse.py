@@ -0,0 +1,157 @@
+import math
+from datetime import date, datetime
+from flask import request, abort, jsonify, make_response
+from flask_restless.search import create_query
+from sqlalchemy import inspect
+from app import db
+from app.pagination import bad_request, results_per_page
+from app.serializers import HIDDEN_COLUMNS
+
+
+MAX_INCLUDE_DEPTH = 2
+
+
+def is_sparse():
+    return 'include' in request.args or any(
+        arg.startswith('fields[') for arg in request.args)
+
+
+def parse_include():
+    """
+    Turns include=menu_items.meal,orders into
+    {'menu_items': {'meal': {}}, 'orders': {}}.
+    """
+    tree = {}
+    for path in filter(None, request.args.get('include', '').split(',')):
+        names = path.strip().split('.')
+        if len(names) > MAX_INCLUDE_DEPTH:
+            bad_request('Includes can be at most {} levels deep'.format(
+                MAX_INCLUDE_DEPTH))
+        node = tree
+        for name in names:
+            node = node.setdefault(name, {})
+    return tree
+
+
+def requested_columns(model):
+    """
+    Returns the columns asked for with fields[<table>]=a,b or all of them.
+    The id always comes along.
+    """
+    columns = [column.key for column in inspect(model).column_attrs
+               if column.key not in HIDDEN_COLUMNS]
+    fields = request.args.get('fields[{}]'.format(model.__tablename__))
+    if fields is None:
+        return columns
+
+    names = [name.strip() for name in fields.split(',') if name.strip()]
+    for name in names:
+        if name not in columns:
+            bad_request("Unknown field '{}' for {}".format(
+                name, model.__tablename__))
+    return ['id'] + [name for name in names if name != 'id']
+
+
+def to_json(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def load(model, query, include, group_by=None):
+    """
+    Selects only the requested columns of the rows in `query` and then,
+    one query per included relation, the rows related to them.
+
+    With `group_by` the rows come back in a dict keyed by that column.
+    """
+    relations = inspect(model).relationships
+    for name in include:
+        if name not in relations:
+            bad_request("Unknown relation '{}' for {}".format(
+                name, model.__tablename__))
+
+    columns = requested_columns(model)
+    keys = set(columns)
+    if group_by is not None:
+        keys.add(group_by)
+    for name in include:
+        keys.update(local.key for local, _ in
+                    relations[name].local_remote_pairs)
+    keys = list(keys)
+
+    rows = [dict(zip(keys, map(to_json, values))) for values in
+            query.with_entities(*[getattr(model, key) for key in keys])]
+
+    for name, nested in include.items():
+        relation = relations[name]
+        (local, remote), = relation.local_remote_pairs
+        related_model = relation.mapper.class_
+        values = set(row[local.key] for row in rows
+                     if row[local.key] is not None)
+        related = load(
+            related_model,
+            related_model.query.filter(remote.in_(values))
+            .order_by(related_model.id),
+            nested, remote.key) if values else {}
+
+        for row in rows:
+            matches = related.get(row[local.key], [])
+            if relation.uselist:
+                row[name] = matches
+            else:
+                row[name] = matches[0] if matches else None
+
+    grouped = {}
+    for row in rows:
+        group = row.get(group_by)
+        for key in keys:
+            if key not in columns:
+                row.pop(key)
+        grouped.setdefault(group, []).append(row)
+    return rows if group_by is None else grouped
+
+
+def sparse(model):
+    """
+    This returns a flask-restless preprocessor that serves GET requests
+    asking for fields[<table>]=a,b and/or include=relation.nested itself,
+    selecting only those columns and relations from the database.
+
+    Without include no relations are sent, with it they are loaded with
+    one query per relation however many rows there are. Pages are only
+    numbered, asking for a `cursor` as well is refused.
+    """
+    def pre_sparse(instance_id=None, search_params=None, **kwargs):
+        if not is_sparse():
+            return
+        if instance_id is None and 'cursor' in request.args:
+            bad_request('A cursor cannot be combined with fields or include')
+
+        include = parse_include()
+        if instance_id is not None:
+            query = model.query.filter(model.id == instance_id)
+            rows = load(model, query, include)
+            abort(jsonify(rows[0]) if rows else
+                  make_response(jsonify({'message': 'Not found'}), 404))
+
+        try:
+            query = create_query(db.session, model, search_params)
+        except Exception:
+            bad_request('Unable to construct query')
+
+        per_page = results_per_page()
+        try:
+            page = max(int(request.args.get('page', 1)), 1)
+        except ValueError:
+            page = 1
+
+        num_results = query.order_by(None).count()
+        page_query = query.limit(per_page).offset((page - 1) * per_page)
+        abort(jsonify({
+            'page': page,
+            'total_pages': int(math.ceil(num_results / float(per_page))),
+            'num_results': num_results,
+            'objects': load(model, page_query, include)
+        }))
+    return pre_sparse
@@ -0,0 +1,65 @@
+from timeit import default_timer
+from flask import g, request, current_app, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def start_statement(conn, cursor, statement, parameters, context,
+                    executemany):
+    conn.info['statement_started'] = default_timer()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def time_statement(conn, cursor, statement, parameters, context,
+                   executemany):
+    if not has_request_context() or 'sql_count' not in g:
+        return
+    seconds = default_timer() - conn.info.pop('statement_started')
+    g.sql_count += 1
+    g.sql_time += seconds
+    # only the first statements are kept for the slow request log
+    if len(g.sql_statements) < \
+            current_app.config['SLOW_REQUEST_STATEMENTS']:
+        g.sql_statements.append((seconds, statement))
+
+
+def start_request():
+    g.request_started = default_timer()
+    g.sql_count = 0
+    g.sql_time = 0.0
+    g.sql_statements = []
+
+
+def time_request(response):
+    """
+    Tells the client how many statements the request ran and how long
+    they and the whole request took in a Server-Timing header, and logs
+    the request with its SQL when that is over SLOW_REQUEST_QUERIES or
+    SLOW_REQUEST_MS.
+
+    Statements run while a streamed body is sent are not counted.
+    """
+    if 'request_started' not in g:
+        return response
+    config = current_app.config
+    total = default_timer() - g.request_started
+    if config['SERVER_TIMING']:
+        response.headers['Server-Timing'] = \
+            'db;desc="{} queries";dur={:.2f}, app;dur={:.2f}'.format(
+                g.sql_count, g.sql_time * 1000, total * 1000)
+
+    if g.sql_count > config['SLOW_REQUEST_QUERIES'] or \
+            total * 1000 > config['SLOW_REQUEST_MS']:
+        current_app.logger.warning(
+            'Slow request %s %s: %s, %d queries in %.1fms of %.1fms\n%s',
+            request.method, request.full_path, response.status_code,
+            g.sql_count, g.sql_time * 1000, total * 1000,
+            '\n'.join('{:8.2f}ms {}'.format(seconds * 1000, statement)
+                      for seconds, statement in g.sql_statements))
+    return response
+
+
+def sql_timing_handler(app):
+    app.before_request(start_request)
+    app.after_request(time_request)
@@ -0,0 +1,30 @@
+from flask import Blueprint, jsonify, current_app
+from app import db
+from app.auth import caterer_auth
+
+
+stats = Blueprint('stats', __name__)
+
+
+@stats.route('/api/v1/stats/menu-cache', methods=['GET'])
+def menu_cache():
+    caterer_auth()
+    return jsonify(current_app.extensions['todays_menu'].stats()), 200
+
+
+@stats.route('/api/v1/stats/passwords', methods=['GET'])
+def passwords():
+    caterer_auth()
+    return jsonify(current_app.extensions['passwords'].stats()), 200
+
+
+@stats.route('/api/v1/stats/login-throttle', methods=['GET'])
+def login_throttle():
+    caterer_auth()
+    return jsonify(current_app.extensions['login_throttle'].stats()), 200
+
+
+@stats.route('/api/v1/stats/database-pool', methods=['GET'])
+def database_pool():
+    caterer_auth()
+    return jsonify(db.pool_stats()), 200
@@ -0,0 +1,229 @@
+import os
+import math
+import time
+import sqlite3
+import threading
+import six
+from collections import OrderedDict
+from flask import current_app, has_app_context
+
+
+class LoginThrottled(Exception):
+    """ Raised when an email or a client has run out of login attempts """
+
+    def __init__(self, retry_after):
+        super(LoginThrottled, self).__init__(
+            'Too many login attempts, please try again later')
+        self.retry_after = retry_after
+
+
+def spend(limits, states, now):
+    """
+    Takes a token from each bucket in `limits`, (key, burst, per_second)
+    triples, whose stored (tokens, updated) pairs are `states`.
+
+    Returns the pairs to store and no shortfall, or None and the seconds
+    until each empty bucket has a token again keyed by its key.
+    """
+    left, short = [], {}
+    for (key, burst, per_second), state in zip(limits, states):
+        tokens, updated = state if state else (burst, now)
+        tokens = min(burst, tokens + (now - updated) * per_second)
+        if tokens < 1:
+            short[key] = (1 - tokens) / per_second
+        left.append((tokens - 1, now))
+    return (None, short) if short else (left, short)
+
+
+def refund(limits, states, now):
+    """
+    Gives a token back to each bucket in `limits`, as `spend` takes them.
+    Buckets never seen are full already.
+    """
+    left = []
+    for (key, burst, per_second), state in zip(limits, states):
+        tokens, updated = state if state else (burst, now)
+        left.append((min(burst, tokens + (now - updated) * per_second + 1),
+                     now))
+    return left, {}
+
+
+class MemoryBuckets:
+    """
+    Token buckets of this worker, the least recently used are dropped
+    past `max_keys`, which only forgives them early.
+    """
+
+    def __init__(self, max_keys):
+        self.buckets = OrderedDict()
+        self.max_keys = max_keys
+        self.lock = threading.Lock()
+
+    def take(self, limits, now):
+        return self.change(spend, limits, now)
+
+    def give_back(self, limits, now):
+        self.change(refund, limits, now)
+
+    def change(self, function, limits, now):
+        with self.lock:
+            keys = [key for key, _, _ in limits]
+            states, short = function(
+                limits, [self.buckets.get(key) for key in keys], now)
+            for key, state in zip(keys, states or []):
+                # moved to the end as the most recently used
+                self.buckets.pop(key, None)
+                self.buckets[key] = state
+            while len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+            return short
+
+    def __len__(self):
+        return len(self.buckets)
+
+
+class SharedBuckets:
+    """
+    Token buckets in a SQLite file, shared by the workers of a host.
+    Buckets idle for `idle` seconds are full again, so they are deleted
+    every so often.
+    """
+
+    PURGE_EVERY = 256
+
+    def __init__(self, path, idle):
+        self.path = path
+        self.idle = idle
+        self.takes = 0
+        self.local = threading.local()
+
+    def connection(self):
+        # one connection per thread, opened again in forked workers
+        if getattr(self.local, 'pid', None) != os.getpid():
+            connection = sqlite3.connect(
+                self.path, timeout=1, isolation_level=None)
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS login_buckets ('
+                'key TEXT PRIMARY KEY, tokens REAL, updated REAL)')
+            self.local.connection = connection
+            self.local.pid = os.getpid()
+        return self.local.connection
+
+    def take(self, limits, now):
+        return self.change(spend, limits, now)
+
+    def give_back(self, limits, now):
+        self.change(refund, limits, now)
+
+    def change(self, function, limits, now):
+        connection = self.connection()
+        keys = [key for key, _, _ in limits]
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            stored = dict((key, (tokens, updated)) for key, tokens, updated
+                          in connection.execute(
+                              'SELECT key, tokens, updated FROM login_buckets'
+                              ' WHERE key IN ({})'.format(
+                                  ', '.join('?' * len(keys))), keys))
+            states, short = function(
+                limits, [stored.get(key) for key in keys], now)
+            if states:
+                connection.executemany(
+                    'INSERT OR REPLACE INTO login_buckets VALUES (?, ?, ?)',
+                    [(key,) + state for key, state in zip(keys, states)])
+            self.takes += 1
+            if self.takes % self.PURGE_EVERY == 0:
+                connection.execute(
+                    'DELETE FROM login_buckets WHERE updated < ?',
+                    (now - self.idle,))
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+        return short
+
+    def __len__(self):
+        return self.connection().execute(
+            'SELECT COUNT(*) FROM login_buckets').fetchone()[0]
+
+
+class LoginThrottle:
+    """
+    Token buckets limiting login attempts per email and per client, so
+    a burst of guesses is turned away before any password is hashed.
+
+    Each bucket holds up to LOGIN_<KIND>_BURST attempts and gets back
+    LOGIN_<KIND>_PER_MINUTE of them a minute. An attempt needs a token
+    from both of its buckets. A login that succeeds gives the client its
+    token back, so only failures count against an address many users
+    share. Buckets live in this worker unless LOGIN_THROTTLE_STORE names
+    a SQLite file for the workers to share.
+    """
+
+    KINDS = ('email', 'client')
+
+    def __init__(self, app=None):
+        self.allowed = 0
+        self.throttled = dict((kind, 0) for kind in self.KINDS)
+        self.lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.limits = dict(
+            (kind, (app.config['LOGIN_{}_BURST'.format(kind.upper())],
+                    app.config['LOGIN_{}_PER_MINUTE'.format(kind.upper())]
+                    / 60.0))
+            for kind in self.KINDS)
+        store = app.config['LOGIN_THROTTLE_STORE']
+        if store:
+            idle = max(burst / per_second
+                       for burst, per_second in self.limits.values())
+            self.buckets = SharedBuckets(store, idle)
+        else:
+            self.buckets = MemoryBuckets(
+                app.config['LOGIN_THROTTLE_MAX_KEYS'])
+        app.extensions['login_throttle'] = self
+
+    def bucket(self, kind, value):
+        return (kind + ':' + value,) + self.limits[kind]
+
+    def check(self, email, client):
+        """ Spends an attempt of both or raises LoginThrottled """
+        limits = [
+            self.bucket('email', six.text_type(email).strip().lower()[:254]),
+            self.bucket('client', client or ''),
+        ]
+        short = self.buckets.take(limits, time.time())
+        kinds = [key.split(':', 1)[0] for key in short]
+        with self.lock:
+            if not short:
+                self.allowed += 1
+            for kind in kinds:
+                self.throttled[kind] += 1
+        # added up across the workers by /metrics
+        if has_app_context() and 'metrics' in current_app.extensions:
+            metrics = current_app.extensions['metrics']
+            if not short:
+                metrics.count('login_throttle_allowed_total', ())
+            for kind in kinds:
+                metrics.count('login_throttle_throttled_total',
+                              (('kind', kind),))
+        if short:
+            raise LoginThrottled(int(math.ceil(max(short.values()))))
+
+    def succeeded(self, client):
+        """ Gives the client back the attempt of a login that succeeded """
+        self.buckets.give_back([self.bucket('client', client or '')],
+                               time.time())
+
+    def stats(self):
+        stats = {
+            'store': 'shared'
+            if isinstance(self.buckets, SharedBuckets) else 'memory',
+            'buckets': len(self.buckets),
+            'allowed': self.allowed,
+        }
+        for kind in self.KINDS:
+            stats['throttled_' + kind] = self.throttled[kind]
+        return stats
@@ -1,12 +1,17 @@
 import re
+import six
 from datetime import datetime, date
-from flask import request
+from flask import request, current_app
 from flask_restless import ProcessingException
+from sqlalchemy import and_
+from sqlalchemy.orm import joinedload
+from app import db
 from app.models import (
     User, UserType, Meal, MenuType,
     Menu, MenuItem, Notification, Order
 )
-from flask_jwt_extended import get_jwt_identity
+from app.current_user import current_user_id
+from app.customize_routes import loaded
 
 
 class AuthorizationError(ProcessingException):
@@ -19,6 +24,26 @@ def clean_unexpected(request, expected):
         del request.json[key]
 
 
+def load_menu_item(menu_item_id):
+    """
+    Loads a menu item that can be ordered, with its menu, in one query.
+    """
+    menu_item = MenuItem.query.options(joinedload(MenuItem.menu)) \
+        .filter(MenuItem.id == menu_item_id).first()
+    if menu_item is None:
+        raise ProcessingException(
+            description='No menu item found for that menu_item_id', 
+            code=400
+        )
+
+    if menu_item.menu.day != datetime.utcnow().date():
+        raise ProcessingException(
+            description='This menu is expired', 
+            code=400
+        )
+    return menu_item
+
+
 class Valid:
     @staticmethod
     def user(**kwargs):
@@ -85,17 +110,19 @@ class Valid:
             )
 
     @staticmethod
-    def post_meal(**kwargs):
-        clean_unexpected(request, ['name', 'cost', 'quantity', 'img_path'])
-
-        fields = request.json
+    def meal(fields):
+        """
+        Checks the name and cost of a new meal without touching the
+        database.
+        """
         if fields.get('name') is None:
             raise ProcessingException(
                 description='Name is required', 
                 code=400
             )
 
-        if len(fields.get('name').strip()) == 0:
+        if not isinstance(fields.get('name'), six.string_types) or \
+                len(fields.get('name').strip()) == 0:
             raise ProcessingException(
                 description='Invalid meal name', 
                 code=400
@@ -107,9 +134,6 @@ class Valid:
                 code=400
             )
 
-        if fields.get('img_path') is None:
-            request.json['img_path'] = None
-
         try:
             float(fields.get('cost'))
         except:
@@ -118,6 +142,16 @@ class Valid:
                 code=400
             )
 
+    @staticmethod
+    def post_meal(**kwargs):
+        clean_unexpected(request, ['name', 'cost', 'quantity', 'img_path'])
+
+        fields = request.json
+        Valid.meal(fields)
+
+        if fields.get('img_path') is None:
+            request.json['img_path'] = None
+
         meal = Meal.query.filter_by(name=fields['name']).first()
         if meal:
             raise ProcessingException(
@@ -215,27 +249,31 @@ class Valid:
                 code=400
             )
 
-        meal = Meal.query.get(fields['meal_id'])
-        if not meal:
+        # the meal, the menu and any menu item pairing them, in one query
+        found = db.session.query(Meal, Menu, MenuItem.id) \
+            .outerjoin(Menu, Menu.id == fields['menu_id']) \
+            .outerjoin(MenuItem, and_(MenuItem.menu_id == Menu.id,
+                                      MenuItem.meal_id == Meal.id)) \
+            .filter(Meal.id == fields['meal_id']).first()
+        if not found:
             raise ProcessingException(
                 description='No meal found for that meal_id', 
                 code=400
             )
 
-        menu = Menu.query.get(fields['menu_id'])
+        meal, menu, menu_item_id = found
         if not menu:
             raise ProcessingException(
                 description='No menu found for that menu_id', 
                 code=400
             )
 
-        menu_item = MenuItem.query.filter_by(menu_id=menu.id, 
-                                             meal_id=meal.id).first()
-        if menu_item:
+        if menu_item_id:
             raise ProcessingException(
                 description='This menu item already exists', 
                 code=400
             )
+        return meal, menu
 
     @staticmethod
     def put_menu_item(instance_id=None, **kwargs):
@@ -275,13 +313,14 @@ class Valid:
 
     @staticmethod
     def post_order(**kwargs):
-        current_user = User.query.filter_by(email=get_jwt_identity()).first()
-        if not current_user:
+        """ Returns the menu item ordered, with its menu """
+        user_id = current_user_id()
+        if user_id is None:
             raise ProcessingException(
                 description='Order could not be processed', 
                 code=500
             )
-        request.json['user_id'] = current_user.id
+        request.json['user_id'] = user_id
 
         clean_unexpected(request, ['menu_item_id', 'user_id', 'quantity'])
         fields = request.json
@@ -296,32 +335,90 @@ class Valid:
         if fields.get('quantity') is None:
             request.json['quantity'] = 1
 
-        menu_item = MenuItem.query.get(fields['menu_item_id'])
-        if menu_item is None:
+        return load_menu_item(fields['menu_item_id'])
+
+    @staticmethod
+    def post_orders(**kwargs):
+        """
+        Validates a batch of orders, checking every menu item and its menu
+        in a single query. Returns the orders ready to be inserted.
+        """
+        user_id = current_user_id()
+        if user_id is None:
+            raise ProcessingException(
+                description='Order could not be processed', 
+                code=500
+            )
+
+        orders = request.json.get('orders')
+        if not isinstance(orders, list) or len(orders) == 0:
             raise ProcessingException(
-                description='No menu item found for that menu_item_id', 
+                description='A list of orders is required', 
                 code=400
             )
 
-        menu = Menu.query.get(menu_item.menu_id)
-        if menu.day != datetime.utcnow().date():
+        max_orders = current_app.config['MAX_BATCH_ORDERS']
+        if len(orders) > max_orders:
             raise ProcessingException(
-                description='This menu is expired', 
+                description='At most {} orders can be placed at once'.format(
+                    max_orders), 
                 code=400
             )
 
+        ids = [order.get('menu_item_id') for order in orders
+               if isinstance(order, dict)]
+        days = dict(db.session.query(MenuItem.id, Menu.day)
+                    .join(Menu, MenuItem.menu_id == Menu.id)
+                    .filter(MenuItem.id.in_(
+                        [id for id in ids if isinstance(id, int)]))
+                    .all())
+
+        errors = []
+        valid_orders = []
+        today = datetime.utcnow().date()
+        for index, order in enumerate(orders, 1):
+            if not isinstance(order, dict) or \
+                    order.get('menu_item_id') is None:
+                errors.append('Order {}: Menu item id is required'.format(
+                    index))
+                continue
+
+            quantity = order.get('quantity', 1)
+            if not isinstance(quantity, int) or quantity < 1:
+                errors.append('Order {}: Quantity must be a positive '
+                              'number'.format(index))
+                continue
+
+            if order['menu_item_id'] not in days:
+                errors.append('Order {}: No menu item found for that '
+                              'menu_item_id'.format(index))
+                continue
+
+            if days[order['menu_item_id']] != today:
+                errors.append('Order {}: This menu is expired'.format(index))
+                continue
+
+            valid_orders.append({
+                'menu_item_id': order['menu_item_id'],
+                'user_id': user_id,
+                'quantity': quantity
+            })
+
+        if errors:
+            raise ProcessingException(description=errors, code=400)
+        return valid_orders
 
     @staticmethod
     def put_order(instance_id=None, **kwargs):
-        current_user = User.query.filter_by(email=get_jwt_identity()).first()
-        if not current_user:
+        user_id = current_user_id()
+        if user_id is None:
             raise ProcessingException(
                 description='Order could not be processed', 
                 code=500
             )
 
-        order = Order.query.get(instance_id)
-        if order.user_id != current_user.id:
+        order = loaded(Order, instance_id)
+        if order.user_id != user_id:
             raise ProcessingException(
                 description='This user cannot edit this order', 
                 code=401
@@ -331,19 +428,8 @@ class Valid:
         fields = request.json
 
         if 'menu_item_id' in fields:
-            menu_item = MenuItem.query.get(fields['menu_item_id'])
-            if menu_item is None:
-                raise ProcessingException(
-                    description='No menu item found for that menu_item_id', 
-                    code=400
-                )
-
-            menu = Menu.query.get(menu_item.menu_id)
-            if menu.day != datetime.utcnow().date():
-                raise ProcessingException(
-                    description='This menu is expired', 
-                    code=400
-                )
+            # loaded into the session, so the update does not fetch it again
+            load_menu_item(fields['menu_item_id'])
 
 
     @staticmethod
@@ -378,6 +464,45 @@ class Valid:
                 code=400
             )
 
+    @staticmethod
+    def post_broadcast(**kwargs):
+        clean_unexpected(request, ['title', 'message', 'audience', 'menu_id'])
+        fields = request.json
+
+        if fields.get('title') is None or \
+                len(fields.get('title').strip()) == 0:
+            raise ProcessingException(
+                description='Title is required', 
+                code=400
+            )
+
+        if fields.get('message') is None or \
+                len(fields.get('message').strip()) == 0:
+            raise ProcessingException(
+                description='Message is required', 
+                code=400
+            )
+
+        if fields.get('audience') not in ['all', 'customers', 'menu']:
+            raise ProcessingException(
+                description='Audience must be all, customers or menu', 
+                code=400
+            )
+
+        if fields['audience'] == 'menu':
+            if fields.get('menu_id') is None:
+                raise ProcessingException(
+                    description='Menu id is required', 
+                    code=400
+                )
+
+            menu = Menu.query.get(fields['menu_id'])
+            if not menu:
+                raise ProcessingException(
+                    description='No menu found for that menu_id', 
+                    code=400
+                )
+
     @staticmethod
     def put_notification(instance_id=None, **kwargs):
         clean_unexpected(request, ['title', 'message', 'user_id'])
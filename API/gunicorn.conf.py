@@ -0,0 +1,8 @@
+"""
+Gunicorn settings, see the Procfile.
+"""
+
+
+def post_worker_init(worker):
+    # before the worker starts its threads, see PasswordHasher
+    worker.wsgi.extensions['passwords'].start()
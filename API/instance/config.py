@@ -2,33 +2,124 @@ import os
 from datetime import timedelta
 
 
+def replica_binds(urls):
+    """ Names each of the comma separated replica urls as a bind """
+    urls = [url.strip() for url in (urls or '').split(',') if url.strip()]
+    return dict(('replica_{}'.format(number), url)
+                for number, url in enumerate(urls))
+
+
 class Config(object):
     DEBUG = False
     SECRET = os.getenv('SECRET')
     SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL')
+    # read-only copies of the database, comma separated, GET requests are
+    # served from them
+    SQLALCHEMY_BINDS = replica_binds(os.getenv('REPLICA_DATABASE_URLS'))
+    SQLALCHEMY_REPLICA_BINDS = sorted(SQLALCHEMY_BINDS)
+    # seconds a user keeps reading from the primary after writing
+    REPLICA_STICKY_SECONDS = 5
+    # send the statement count and database time in a Server-Timing
+    # header, and log requests running more statements or taking longer
+    # than this along with their first SLOW_REQUEST_STATEMENTS statements
+    SERVER_TIMING = True
+    SLOW_REQUEST_QUERIES = 25
+    SLOW_REQUEST_MS = 500
+    SLOW_REQUEST_STATEMENTS = 50
+    # directory the workers share their metrics through, emptied on each
+    # deploy, None serves only the metrics of the worker answering
+    METRICS_DIR = os.getenv('METRICS_DIR')
+    METRICS_FLUSH_SECONDS = 5
+    # bearer token /metrics asks for, None leaves it open
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
-    
+    # connections each worker keeps and may open on top of them, so the
+    # workers times their sum should stay under the server's limit
+    SQLALCHEMY_POOL_SIZE = 5
+    SQLALCHEMY_MAX_OVERFLOW = 5
+    # seconds to wait for a connection before giving up
+    SQLALCHEMY_POOL_TIMEOUT = 10
+    # seconds after which a connection is replaced, and whether to test
+    # connections as they are checked out
+    SQLALCHEMY_POOL_RECYCLE = 1800
+    SQLALCHEMY_POOL_PRE_PING = True
+    # milliseconds a statement may run before PostgreSQL cancels it
+    SQLALCHEMY_STATEMENT_TIMEOUT = 30000
+
     PROPAGATE_ERRORS = True
     PROPAGATE_EXCEPTIONS = True
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=48)
     JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY')
+    JWT_BLACKLIST_ENABLED = True
+    JWT_BLACKLIST_TOKEN_CHECKS = ['access']
+    # seconds between reads of tokens revoked by other workers
+    REVOKED_TOKENS_REFRESH = 30
+    # seconds another worker may serve today's menu after it changes
+    TODAYS_MENU_CACHE_TTL = 10
+    MAX_BATCH_ORDERS = 50
+    MEAL_IMPORT_CHUNK_SIZE = 500
+    # rows fetched from the database at a time by streamed listings and
+    # exports
+    STREAM_YIELD_PER = 500
+    # passlib scheme and work factor of new password hashes, older ones
+    # are upgraded on login
+    PASSWORD_SCHEME = 'bcrypt'
+    PASSWORD_ROUNDS = 12
+    # processes hashing passwords, 0 hashes them in the request thread
+    PASSWORD_POOL_SIZE = 2
+    # passwords that may wait for a process before logins get a 503, kept
+    # under the worker's threads (see the Procfile) less the pool size so
+    # some are always left for other requests
+    PASSWORD_QUEUE_LIMIT = 4
+    # seconds a password may take, queueing included, before the login
+    # gets a 503
+    PASSWORD_TIMEOUT = 10
+    # login attempts an email or a client may make at once and get back
+    # each minute, the ones over are answered 429 without hashing
+    LOGIN_EMAIL_BURST = 10
+    LOGIN_EMAIL_PER_MINUTE = 5
+    LOGIN_CLIENT_BURST = 30
+    LOGIN_CLIENT_PER_MINUTE = 30
+    # SQLite file sharing the login buckets between the workers of a host,
+    # None keeps them in each worker
+    LOGIN_THROTTLE_STORE = os.getenv('LOGIN_THROTTLE_STORE')
+    # emails and clients a worker keeps buckets for
+    LOGIN_THROTTLE_MAX_KEYS = 100000
+    # proxies in front of the app whose X-Forwarded-For entries are
+    # trusted to name the client, 0 takes the address connecting
+    PROXY_COUNT = 0
 
 
 class ProductionConfig(Config):
     DEBUG = False
     TESTING = False
+    # the Heroku router
+    PROXY_COUNT = 1
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=2)
+    SQLALCHEMY_POOL_SIZE = 10
+    SQLALCHEMY_MAX_OVERFLOW = 10
+    SQLALCHEMY_STATEMENT_TIMEOUT = 15000
 
 
 class DevConfig(Config):
     "Config for development"
     DEBUG = True
+    PASSWORD_ROUNDS = 10
+    SQLALCHEMY_POOL_SIZE = 2
+    SQLALCHEMY_STATEMENT_TIMEOUT = None
 
 
 class TestingConfig(Config):
     DEBUG = True
     TESTING = True
     SQLALCHEMY_DATABASE_URI = os.getenv('TEST_DATABASE_URL')
+    SQLALCHEMY_BINDS = replica_binds(os.getenv('TEST_REPLICA_DATABASE_URLS'))
+    SQLALCHEMY_REPLICA_BINDS = sorted(SQLALCHEMY_BINDS)
+    PASSWORD_POOL_SIZE = 0
+    SQLALCHEMY_POOL_PRE_PING = False
+    PROXY_COUNT = 1
+    # the cheapest bcrypt allows, tests log in all the time
+    PASSWORD_ROUNDS = 4
 
 
 app_config = {
@@ -1,8 +1,16 @@
+import io
 import os
-from flask_script import Manager
+import gzip
+from datetime import datetime
+from flask_script import Manager, Command
 from flask_migrate import Migrate, MigrateCommand
 from app.models import User, UserType
 from app import db, create_app
+from app.meals import import_meals as import_meal_rows
+from app.serializers import benchmark
+from app.reports import rebuild_rollups
+from app.passwords import benchmark as benchmark_hashes
+from app.orders import export_rows, write_csv
 
 
 app = create_app(config_name=os.getenv('APP_MODE'))
@@ -23,5 +31,64 @@ def seed():
     print('manager: seed complete')
 
 
+@manager.command
+def import_meals(path, chunk_size=500):
+    """ Imports meals from a .csv file or a JSON-lines file """
+    format = 'csv' if path.endswith('.csv') else 'jsonl'
+    with io.open(path, encoding='utf-8') as lines:
+        report = import_meal_rows(lines, format, int(chunk_size))
+    for error in report['errors']:
+        print('line {line}: {message}'.format(**error))
+    print('manager: imported {imported} meals in {seconds}s '
+          '({rows_per_second} rows/s)'.format(**report))
+
+
+@manager.command
+def rebuild_reports():
+    """ Recomputes the daily order rollups the reports read from orders """
+    rebuild_rollups(db.session.connection())
+    db.session.commit()
+    print('manager: rebuilt the daily order rollups')
+
+
+@manager.command
+def benchmark_serializers(orders=500, rounds=20):
+    """ Compares flask-restless' to_dict with the precompiled serializers """
+    timings = benchmark(int(orders), int(rounds))
+    for name, seconds in sorted(timings.items()):
+        print('{:>10}: {:.2f}ms per {} orders'.format(
+            name, seconds * 1000, orders))
+    print('manager: the serializer is {:.1f}x faster'.format(
+        timings['to_dict'] / timings['serializer']))
+
+
+@manager.command
+def benchmark_passwords(scheme='bcrypt', rounds='10,11,12,13', duration=1.0):
+    """ Reports password hashes per second at each number of rounds """
+    rounds = [int(value) for value in rounds.split(',')]
+    for value, rate in benchmark_hashes(scheme, rounds, float(duration)):
+        print('{} rounds {:>3}: {:8.1f} hashes/s, {:7.1f}ms each'.format(
+            scheme, value, rate, 1000 / rate))
+
+
+def export_orders(start, end, path, chunk_size=500):
+    """
+    Writes the orders placed from day START to day END (like 2018-05-01)
+    to PATH as CSV, gzipped when PATH ends with .gz
+    """
+    start, end = [datetime.strptime(day, '%Y-%m-%d').date()
+                  for day in (start, end)]
+    opener = gzip.open if path.endswith('.gz') else open
+    rows = 0
+    with opener(path, 'wb') as export:
+        for line in write_csv(export_rows(start, end, int(chunk_size))):
+            export.write(line.encode('utf-8'))
+            rows += 1
+    print('manager: exported {} orders to {}'.format(rows - 1, path))
+
+
+manager.add_command('export-orders', Command(export_orders))
+
+
 if __name__ == '__main__':
     manager.run()
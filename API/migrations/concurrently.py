@@ -0,0 +1,22 @@
+from contextlib import contextmanager
+from alembic import op
+
+
+@contextmanager
+def outside_transaction():
+    """
+    Commits what the migration did so far and has the connection
+    autocommit, PostgreSQL only builds and drops indexes CONCURRENTLY,
+    without locking writes to the table, outside of a transaction.
+    """
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        yield
+        return
+    connection = bind.connection.connection
+    connection.commit()
+    connection.autocommit = True
+    try:
+        yield
+    finally:
+        connection.autocommit = False
@@ -0,0 +1,39 @@
+"""index hot lookup columns
+
+Revision ID: 13aa2c4bcc6b
+Revises: 227dbae55739
+Create Date: 2026-10-18 07:05:40.548923
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from migrations.concurrently import outside_transaction
+
+
+# revision identifiers, used by Alembic.
+revision = '13aa2c4bcc6b'
+down_revision = '227dbae55739'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with outside_transaction():
+        op.create_index('ix_blacklist_token', 'blacklist', ['token'], unique=False, postgresql_concurrently=True)
+        op.create_index('ix_menu_items_meal_id', 'menu_items', ['meal_id'], unique=False, postgresql_concurrently=True)
+        op.create_index('ix_menu_items_menu_id_meal_id', 'menu_items', ['menu_id', 'meal_id'], unique=True, postgresql_concurrently=True)
+        op.create_index('ix_menus_day', 'menus', ['day'], unique=False, postgresql_concurrently=True)
+        op.create_index('ix_notifications_user_id', 'notifications', ['user_id'], unique=False, postgresql_concurrently=True)
+        op.create_index('ix_orders_menu_item_id', 'orders', ['menu_item_id'], unique=False, postgresql_concurrently=True)
+        op.create_index('ix_orders_user_id', 'orders', ['user_id'], unique=False, postgresql_concurrently=True)
+
+
+def downgrade():
+    with outside_transaction():
+        op.drop_index('ix_orders_user_id', table_name='orders', postgresql_concurrently=True)
+        op.drop_index('ix_orders_menu_item_id', table_name='orders', postgresql_concurrently=True)
+        op.drop_index('ix_notifications_user_id', table_name='notifications', postgresql_concurrently=True)
+        op.drop_index('ix_menus_day', table_name='menus', postgresql_concurrently=True)
+        op.drop_index('ix_menu_items_menu_id_meal_id', table_name='menu_items', postgresql_concurrently=True)
+        op.drop_index('ix_menu_items_meal_id', table_name='menu_items', postgresql_concurrently=True)
+        op.drop_index('ix_blacklist_token', table_name='blacklist', postgresql_concurrently=True)
@@ -0,0 +1,44 @@
+"""revoke claims on role change
+
+Revision ID: 5c1e7a9d2b40
+Revises: f22e6cbf59ea
+Create Date: 2026-10-18 11:02:41.318520
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c1e7a9d2b40'
+down_revision = 'f22e6cbf59ea'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # role changes made straight in the database revoke tokens too, other
+    # databases rely on the app recording them
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute("""
+CREATE OR REPLACE FUNCTION revoke_claims_on_role_change() RETURNS trigger
+AS $$
+BEGIN
+    INSERT INTO blacklist (token, created_at)
+    VALUES ('claims:' || NEW.id, clock_timestamp() AT TIME ZONE 'utc');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql
+""")
+    op.execute("""
+CREATE TRIGGER users_role_change AFTER UPDATE OF role ON users
+FOR EACH ROW WHEN (OLD.role IS DISTINCT FROM NEW.role)
+EXECUTE PROCEDURE revoke_claims_on_role_change()
+""")
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute('DROP TRIGGER IF EXISTS users_role_change ON users')
+        op.execute('DROP FUNCTION IF EXISTS revoke_claims_on_role_change()')
@@ -0,0 +1,27 @@
+"""blacklist created_at index
+
+Revision ID: 8d4b2f6a1c37
+Revises: 5c1e7a9d2b40
+Create Date: 2026-10-18 16:02:11.482913
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from migrations.concurrently import outside_transaction
+
+
+# revision identifiers, used by Alembic.
+revision = '8d4b2f6a1c37'
+down_revision = '5c1e7a9d2b40'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with outside_transaction():
+        op.create_index('ix_blacklist_created_at', 'blacklist', ['created_at'], unique=False, postgresql_concurrently=True)
+
+
+def downgrade():
+    with outside_transaction():
+        op.drop_index('ix_blacklist_created_at', table_name='blacklist', postgresql_concurrently=True)
@@ -0,0 +1,37 @@
+"""keyset pagination indexes
+
+Revision ID: f3710441b17f
+Revises: 13aa2c4bcc6b
+Create Date: 2026-10-18 07:21:29.326305
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from migrations.concurrently import outside_transaction
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3710441b17f'
+down_revision = '13aa2c4bcc6b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with outside_transaction():
+        op.create_index('ix_notifications_created_at', 'notifications', ['created_at', 'id'], unique=False, postgresql_concurrently=True)
+        op.create_index('ix_notifications_user_id_created_at', 'notifications', ['user_id', 'created_at', 'id'], unique=False, postgresql_concurrently=True)
+        op.drop_index('ix_notifications_user_id', table_name='notifications', postgresql_concurrently=True)
+        op.create_index('ix_orders_created_at', 'orders', ['created_at', 'id'], unique=False, postgresql_concurrently=True)
+        op.create_index('ix_orders_user_id_created_at', 'orders', ['user_id', 'created_at', 'id'], unique=False, postgresql_concurrently=True)
+        op.drop_index('ix_orders_user_id', table_name='orders', postgresql_concurrently=True)
+
+
+def downgrade():
+    with outside_transaction():
+        op.create_index('ix_orders_user_id', 'orders', ['user_id'], unique=False, postgresql_concurrently=True)
+        op.drop_index('ix_orders_user_id_created_at', table_name='orders', postgresql_concurrently=True)
+        op.drop_index('ix_orders_created_at', table_name='orders', postgresql_concurrently=True)
+        op.create_index('ix_notifications_user_id', 'notifications', ['user_id'], unique=False, postgresql_concurrently=True)
+        op.drop_index('ix_notifications_user_id_created_at', table_name='notifications', postgresql_concurrently=True)
+        op.drop_index('ix_notifications_created_at', table_name='notifications', postgresql_concurrently=True)
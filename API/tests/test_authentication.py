@@ -1,7 +1,13 @@
+import os
 import json
+import tempfile
 import unittest
+from datetime import timedelta
 from app import create_app, db
-from app.models import User, UserType
+from app.models import User, UserType, Blacklist
+from flask_jwt_extended import get_jti
+from app.passwords import PasswordHasher, PasswordPoolBusy
+from app.throttle import LoginThrottle, LoginThrottled
 
 class AuthenticationTestCase(unittest.TestCase):
     """ This will test authentication endpoints"""
@@ -202,6 +208,188 @@ class AuthenticationTestCase(unittest.TestCase):
         self.assertEqual(res.status_code, 200)
         self.assertEqual(json_result['user']['email'], 'john@doe.com')
 
+    def test_logged_out_token_is_rejected(self):
+        headers = self.login()
+        res = self.client().delete('/api/v1/auth/logout', headers=headers)
+        self.assertEqual(res.status_code, 200)
+
+        res = self.client().get('/api/v1/auth/get', headers=headers)
+        self.assertEqual(res.status_code, 401)
+
+    def test_token_revoked_by_another_worker_is_rejected(self):
+        headers = self.login()
+        res = self.client().get('/api/v1/auth/get', headers=headers)
+        self.assertEqual(res.status_code, 200)
+
+        with self.app.app_context():
+            token = headers['Authorization'].split()[1]
+            Blacklist(token=get_jti(token)).save()
+
+        # the token is only picked up on the next refresh of the cache
+        res = self.client().get('/api/v1/auth/get', headers=headers)
+        self.assertEqual(res.status_code, 200)
+
+        self.app.extensions['revoked_tokens'].last_refresh = 0
+        res = self.client().get('/api/v1/auth/get', headers=headers)
+        self.assertEqual(res.status_code, 401)
+
+    def test_revocation_committed_after_a_later_one_is_not_missed(self):
+        headers = self.login()
+        revoked_tokens = self.app.extensions['revoked_tokens']
+        with self.app.app_context():
+            later = Blacklist(token='later')
+            later.id = 10
+            later.save()
+        res = self.client().get('/api/v1/auth/get', headers=headers)
+        self.assertEqual(res.status_code, 200)
+
+        # given an earlier id and stamp than the row already read but
+        # committed after it, as a logout racing another one may be
+        with self.app.app_context():
+            token = headers['Authorization'].split()[1]
+            revocation = Blacklist(token=get_jti(token))
+            revocation.id = 5
+            revocation.created_at = revoked_tokens.read_at - \
+                timedelta(seconds=1)
+            revocation.save()
+
+        revoked_tokens.last_refresh = 0
+        res = self.client().get('/api/v1/auth/get', headers=headers)
+        self.assertEqual(res.status_code, 401)
+
+    def test_passwords_are_hashed_in_a_process_pool(self):
+        self.app.config.update(PASSWORD_POOL_SIZE=1, PASSWORD_QUEUE_LIMIT=0)
+        passwords = PasswordHasher(self.app)
+        password_hash = passwords.hash('secret')
+        self.assertEqual(passwords.verify('secret', password_hash),
+                         (True, None))
+        self.assertEqual(passwords.verify('wrong', password_hash),
+                         (False, None))
+        passwords.pool.close()
+        passwords.pool.join()
+
+        stats = passwords.stats()
+        self.assertEqual(stats['hashed'], 3)
+        self.assertGreater(stats['average_hash_time'], 0)
+
+        # the one process is taken and nothing may wait for it
+        passwords.pending = 1
+        self.assertRaises(PasswordPoolBusy, passwords.verify,
+                          'secret', password_hash)
+        self.assertEqual(passwords.stats()['rejected'], 1)
+
+    def test_passwords_taking_too_long_are_turned_away(self):
+        self.app.config.update(PASSWORD_POOL_SIZE=1, PASSWORD_TIMEOUT=0)
+        passwords = PasswordHasher(self.app)
+        passwords.start()
+        self.assertRaises(PasswordPoolBusy, passwords.hash, 'secret')
+        self.assertEqual(passwords.stats()['rejected'], 1)
+        self.assertEqual(passwords.pending, 0)
+        passwords.pool.terminate()
+        passwords.pool.join()
+
+    def test_login_is_turned_away_when_passwords_pile_up(self):
+        self.client().post('/api/v1/auth/signup',
+                           data=self.user, headers=self.headers)
+        passwords = self.app.extensions['passwords']
+        passwords.size, passwords.queue_limit, passwords.pending = 1, 0, 1
+        res = self.client().post('/api/v1/auth/login',
+                                 data=self.user, headers=self.headers)
+        self.assertEqual(res.status_code, 503)
+        self.assertEqual(res.headers['Retry-After'], '1')
+
+    def test_outdated_password_hash_is_upgraded_on_login(self):
+        self.client().post('/api/v1/auth/signup',
+                           data=self.user, headers=self.headers)
+        # as if the work factor was raised since the user signed up
+        self.app.extensions['passwords'].settings = ('bcrypt', 5)
+        res = self.client().post('/api/v1/auth/login',
+                                 data=self.user, headers=self.headers)
+        self.assertEqual(res.status_code, 200)
+        with self.app.app_context():
+            user = User.query.filter_by(email='john@doe.com').first()
+            self.assertTrue(user.password_hash.startswith('$2b$05$'))
+            self.assertTrue(user.validate_password('secret'))
+
+    def test_login_attempts_over_the_limit_are_throttled(self):
+        self.client().post('/api/v1/auth/signup',
+                           data=self.user, headers=self.headers)
+        self.app.config.update(LOGIN_EMAIL_BURST=2, LOGIN_EMAIL_PER_MINUTE=1)
+        throttle = LoginThrottle(self.app)
+        wrong = json.dumps({'email': 'john@doe.com', 'password': 'wrong'})
+        for _ in range(2):
+            res = self.client().post('/api/v1/auth/login',
+                                     data=wrong, headers=self.headers)
+            self.assertEqual(res.status_code, 400)
+
+        passwords = self.app.extensions['passwords']
+        hashed = passwords.hashed
+        res = self.client().post('/api/v1/auth/login',
+                                 data=self.user, headers=self.headers)
+        self.assertEqual(res.status_code, 429)
+        self.assertEqual(res.headers['Retry-After'], '60')
+        # turned away before the password was checked
+        self.assertEqual(passwords.hashed, hashed)
+
+        stats = throttle.stats()
+        self.assertEqual((stats['allowed'], stats['throttled_email'],
+                          stats['throttled_client']), (2, 1, 0))
+        text = self.client().get('/metrics').get_data(as_text=True)
+        self.assertIn('login_throttle_allowed_total 2.0', text)
+        self.assertIn('login_throttle_throttled_total{kind="email"} 1.0',
+                      text)
+
+    def test_only_failed_logins_count_against_the_forwarded_client(self):
+        self.client().post('/api/v1/auth/signup',
+                           data=self.user, headers=self.headers)
+        self.app.config.update(LOGIN_CLIENT_BURST=2,
+                               LOGIN_CLIENT_PER_MINUTE=1)
+        throttle = LoginThrottle(self.app)
+        office = dict(self.headers, **{'X-Forwarded-For': '203.0.113.7'})
+        for _ in range(3):
+            res = self.client().post('/api/v1/auth/login',
+                                     data=self.user, headers=office)
+            self.assertEqual(res.status_code, 200)
+
+        wrong = json.dumps({'email': 'john@doe.com', 'password': 'wrong'})
+        for _ in range(2):
+            res = self.client().post('/api/v1/auth/login',
+                                     data=wrong, headers=office)
+            self.assertEqual(res.status_code, 400)
+        res = self.client().post('/api/v1/auth/login',
+                                 data=self.user, headers=office)
+        self.assertEqual(res.status_code, 429)
+
+        # another client behind the same proxy has its own bucket
+        home = dict(self.headers, **{'X-Forwarded-For': '198.51.100.2'})
+        res = self.client().post('/api/v1/auth/login',
+                                 data=self.user, headers=home)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(throttle.stats()['throttled_client'], 1)
+
+    def test_workers_can_share_login_buckets(self):
+        path = os.path.join(tempfile.mkdtemp(), 'buckets.db')
+        self.app.config.update(LOGIN_THROTTLE_STORE=path,
+                               LOGIN_CLIENT_BURST=1)
+        first, second = LoginThrottle(self.app), LoginThrottle(self.app)
+        first.check('john@doe.com', '10.0.0.1')
+        self.assertRaises(LoginThrottled, second.check,
+                          'jane@doe.com', '10.0.0.1')
+        second.check('jane@doe.com', '10.0.0.2')
+        self.assertEqual(second.stats()['buckets'], 4)
+        self.assertEqual(second.stats()['store'], 'shared')
+
+    def login(self):
+        self.client().post('/api/v1/auth/signup',
+                           data=self.user, headers=self.headers)
+        res = self.client().post('/api/v1/auth/login',
+                                 data=self.user, headers=self.headers)
+        json_result = json.loads(res.get_data(as_text=True))
+        return {
+            'Content-Type' : 'application/json',
+            'Authorization': 'Bearer {}'.format(json_result['access_token'])
+        }
+
     def tearDown(self):
         with self.app.app_context():
             db.session.remove()
@@ -0,0 +1,97 @@
+import os
+import json
+import sqlite3
+import tempfile
+import time
+import unittest
+from sqlalchemy.exc import TimeoutError
+from werkzeug.http import parse_cookie
+from app import create_app, db
+from app.database import (
+    TimedNullPool, TimedQueuePool, READ_PRIMARY_COOKIE
+)
+from app.models import Meal
+from tests.base import BaseTest
+
+
+class DatabasePoolTestCase(BaseTest):
+    """ This will test the database pool settings and stats """
+
+    def setUp(self):
+        self.app = create_app(config_name='testing')
+        self.client = self.app.test_client
+
+        with self.app.app_context():
+            db.create_all()
+
+    def test_pool_stats_count_checkouts(self):
+        caterer_header, _ = self.loginCaterer()
+        res = self.client().get('/api/v1/stats/database-pool',
+                                headers=caterer_header)
+        json_result = json.loads(res.get_data(as_text=True))
+        self.assertEqual(res.status_code, 200)
+        # SQLite files get a connection per checkout
+        self.assertEqual(json_result['pool'], TimedNullPool.__name__)
+        self.assertGreater(json_result['checkouts'], 0)
+        self.assertEqual(json_result['timeouts'], 0)
+
+    def test_queue_pool_counts_timeouts(self):
+        pool = TimedQueuePool(lambda: sqlite3.connect(':memory:'),
+                              pool_size=1, max_overflow=0, timeout=0.01)
+        connection = pool.connect()
+        self.assertRaises(TimeoutError, pool.connect)
+        connection.close()
+        pool.connect().close()
+
+        stats = pool.stats.as_dict()
+        self.assertEqual((stats['checkouts'], stats['timeouts']), (2, 1))
+        self.assertEqual(pool.checkedin(), 1)
+
+    def test_reads_go_to_replica_except_after_writing(self):
+        replica = os.path.join(tempfile.mkdtemp(), 'replica.db')
+        self.app.config.update(
+            SQLALCHEMY_BINDS={'replica_0': 'sqlite:///' + replica},
+            SQLALCHEMY_REPLICA_BINDS=['replica_0'])
+        with self.app.app_context():
+            db.Model.metadata.create_all(db.get_engine(bind='replica_0'))
+
+        caterer_header, _ = self.loginCaterer()
+        customer_header, _ = self.loginCustomer()
+        caterer = self.client()
+        res = caterer.post('/api/v1/meals', headers=caterer_header,
+                           data=json.dumps({'name': 'Pilau', 'cost': 350,
+                                            'img_path': '#'}))
+        self.assertEqual(res.status_code, 201)
+        until = parse_cookie(res.headers['Set-Cookie'])[READ_PRIMARY_COOKIE]
+
+        def count_meals(client, headers):
+            res = client.get('/api/v1/meals', headers=headers)
+            return json.loads(res.get_data(as_text=True))['num_results']
+
+        # nothing replicates here, so the replica never sees the meal
+        self.assertEqual(count_meals(self.client(), customer_header), 0)
+        self.assertEqual(count_meals(caterer, caterer_header), 1)
+        # the caterer's cookie holds on another worker too
+        other_worker = create_app(config_name='testing')
+        other_worker.config.update(
+            SQLALCHEMY_BINDS=self.app.config['SQLALCHEMY_BINDS'],
+            SQLALCHEMY_REPLICA_BINDS=['replica_0'])
+        other = other_worker.test_client()
+        self.assertEqual(count_meals(other, caterer_header), 0)
+        other.set_cookie('localhost', READ_PRIMARY_COOKIE, until)
+        self.assertEqual(count_meals(other, caterer_header), 1)
+
+        caterer.set_cookie('localhost', READ_PRIMARY_COOKIE,
+                           str(time.time() - 1))
+        self.assertEqual(count_meals(caterer, caterer_header), 0)
+        with self.app.app_context():
+            self.assertEqual(Meal.query.count(), 1)
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import unittest
+from app import create_app, db
+
+
+# columns the application filters on besides foreign keys. Add a column
+# here when you start querying by it.
+FILTERED_COLUMNS = [
+    'blacklist.token',
+    'daily_orders.day',
+    'meals.name',
+    'menus.day',
+    'users.email',
+]
+
+
+class IndexTestCase(unittest.TestCase):
+    """ This will ensure the columns we look rows up by are indexed """
+
+    def setUp(self):
+        self.app = create_app(config_name='testing')
+
+    def leading_columns(self, table):
+        """ Returns the names of columns an index on this table starts with """
+        leading = set()
+        for constraint in list(table.indexes) + list(table.constraints):
+            if isinstance(constraint, (db.Index, db.PrimaryKeyConstraint,
+                                       db.UniqueConstraint)):
+                leading.add(list(constraint.columns)[0].name)
+        leading.update(column.name for column in table.columns
+                       if column.index or column.unique)
+        return leading
+
+    def test_foreign_keys_are_indexed(self):
+        for table in db.metadata.sorted_tables:
+            leading = self.leading_columns(table)
+            for foreign_key in table.foreign_keys:
+                self.assertIn(
+                    foreign_key.parent.name, leading,
+                    '{} has no index'.format(foreign_key.parent)
+                )
+
+    def test_filtered_columns_are_indexed(self):
+        tables = db.metadata.tables
+        for name in FILTERED_COLUMNS:
+            table_name, column_name = name.split('.')
+            self.assertIn(
+                column_name, self.leading_columns(tables[table_name]),
+                '{} has no index'.format(name)
+            )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -91,6 +91,78 @@ class MealTestCase(BaseTest):
                                  data=self.meal, headers=caterer_header)
         self.assertEqual(res.status_code, 400)
 
+    def test_meals_can_be_imported_from_csv(self):
+        caterer_header, _ = self.loginCaterer()
+        res = self.client().post('/api/v1/meals',
+                                 data=self.meal, headers=caterer_header)
+        self.assertEqual(res.status_code, 201)
+
+        headers = dict(caterer_header, **{'Content-Type': 'text/csv'})
+        res = self.client().post(
+            '/api/v1/meals/import',
+            data='name,cost,img_path\n'
+                 'Chapati,50,#\n'
+                 'Ugali,100,#\n'
+                 'Pilau,abc,#\n'
+                 'Chapati,60,#\n'
+                 'Githeri,80,\n',
+            headers=headers
+        )
+        json_result = json.loads(res.get_data(as_text=True))
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(json_result['imported'], 2)
+        self.assertEqual(
+            sorted(error['line'] for error in json_result['errors']),
+            [3, 4, 5]
+        )
+
+        res = self.client().get('/api/v1/meals', headers=caterer_header)
+        json_result = json.loads(res.get_data(as_text=True))
+        self.assertEqual(json_result['num_results'], 3)
+
+    def test_meals_with_non_ascii_names_can_be_imported_from_csv(self):
+        caterer_header, _ = self.loginCaterer()
+        headers = dict(caterer_header, **{'Content-Type': 'text/csv'})
+        res = self.client().post(
+            '/api/v1/meals/import',
+            data=u'name,cost,img_path\n'
+                 u'Cr\u00e8me br\u00fbl\u00e9e,250,#\n'.encode('utf-8'),
+            headers=headers
+        )
+        json_result = json.loads(res.get_data(as_text=True))
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(json_result['imported'], 1)
+        self.assertEqual(json_result['errors'], [])
+
+        res = self.client().get('/api/v1/meals', headers=caterer_header)
+        json_result = json.loads(res.get_data(as_text=True))
+        self.assertEqual(json_result['objects'][0]['name'],
+                         u'Cr\u00e8me br\u00fbl\u00e9e')
+
+    def test_meals_can_be_imported_from_json_lines(self):
+        caterer_header, _ = self.loginCaterer()
+        headers = dict(caterer_header,
+                       **{'Content-Type': 'application/x-ndjson'})
+        res = self.client().post(
+            '/api/v1/meals/import',
+            data='{"name": "Chapati", "cost": 50}\n'
+                 'not json\n'
+                 '{"name": "Pilau", "cost": 150, "img_path": "#"}\n',
+            headers=headers
+        )
+        json_result = json.loads(res.get_data(as_text=True))
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(json_result['imported'], 2)
+        self.assertEqual(json_result['errors'][0]['line'], 2)
+
+    def test_customer_cannot_import_meals(self):
+        customer_header, _ = self.loginCustomer()
+        headers = dict(customer_header, **{'Content-Type': 'text/csv'})
+        res = self.client().post('/api/v1/meals/import',
+                                 data='name,cost\nChapati,50\n',
+                                 headers=headers)
+        self.assertEqual(res.status_code, 401)
+
     def test_can_get_all_meals(self):
         caterer_header, id = self.loginCaterer()
         res = self.client().post('/api/v1/meals',
@@ -103,6 +175,36 @@ class MealTestCase(BaseTest):
         self.assertEqual(json_result['num_results'], 1)
         self.assertIn(b'objects', res.data)
 
+    def test_unchanged_meals_are_not_sent_again(self):
+        caterer_header, _ = self.loginCaterer()
+        res = self.client().post('/api/v1/meals',
+                                 data=self.meal, headers=caterer_header)
+        self.assertEqual(res.status_code, 201)
+
+        res = self.client().get('/api/v1/meals', headers=caterer_header)
+        self.assertEqual(res.status_code, 200)
+        etag = res.headers['ETag']
+        last_modified = res.headers['Last-Modified']
+
+        headers = dict(caterer_header, **{'If-None-Match': etag})
+        res = self.client().get('/api/v1/meals', headers=headers)
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(res.data, b'')
+
+        headers = dict(caterer_header, **{'If-Modified-Since': last_modified})
+        res = self.client().get('/api/v1/meals', headers=headers)
+        self.assertEqual(res.status_code, 304)
+
+        headers = dict(caterer_header, **{'If-None-Match': etag})
+        res = self.client().get('/api/v1/meals/1', headers=headers)
+        self.assertEqual(res.status_code, 200)
+
+        res = self.client().delete('/api/v1/meals/1', headers=caterer_header)
+        self.assertEqual(res.status_code, 200)
+        res = self.client().get('/api/v1/meals', headers=headers)
+        self.assertEqual(res.status_code, 200)
+        self.assertNotEqual(res.headers['ETag'], etag)
+
     def test_can_get_meal_by_id(self):
         caterer_header, id = self.loginCaterer()
         res = self.client().post('/api/v1/meals',
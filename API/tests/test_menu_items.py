@@ -1,7 +1,10 @@
 import os
 import json
 import unittest
+from datetime import datetime
+from sqlalchemy import event
 from app import create_app, db
+from app.validators import Valid
 from app.models import Meal, MenuType, Menu
 from tests.base import BaseTest
 
@@ -227,6 +230,89 @@ class MenuItemTestCase(BaseTest):
                                 headers=customer_header)
         self.assertEqual(res.status_code, 404)
 
+    def test_can_select_fields_and_includes(self):
+        caterer_header, _ = self.loginCaterer()
+        res = self.client().post(
+            '/api/v1/menu_items',
+            data=self.menu_item,
+            headers=caterer_header
+        )
+        self.assertEqual(res.status_code, 201)
+
+        customer_header, _ = self.loginCustomer()
+        res = self.client().get(
+            '/api/v1/menu_items?fields[menu_items]=meal_id'
+            '&include=meal&fields[meals]=name,cost',
+            headers=customer_header
+        )
+        json_result = json.loads(res.get_data(as_text=True))
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(json_result['num_results'], 1)
+        self.assertEqual(json_result['objects'][0], {
+            'id': 1,
+            'meal_id': 1,
+            'meal': {'id': 1, 'name': 'meal_1', 'cost': 200},
+        })
+
+        res = self.client().get(
+            '/api/v1/menu_items/1?fields[menu_items]=menu_id'
+            '&include=menu.menu_items&fields[menus]=category',
+            headers=customer_header
+        )
+        json_result = json.loads(res.get_data(as_text=True))
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(json_result['menu']['category'], MenuType.BREAKFAST)
+        self.assertEqual(len(json_result['menu']['menu_items']), 1)
+        self.assertNotIn('meal_id', json_result)
+
+    def test_nested_includes_are_not_served_stale(self):
+        caterer_header, _ = self.loginCaterer()
+        res = self.client().post(
+            '/api/v1/menu_items',
+            data=self.menu_item,
+            headers=caterer_header
+        )
+        self.assertEqual(res.status_code, 201)
+        # updated_at only has whole seconds on SQLite
+        with self.app.app_context():
+            Meal.query.update({'updated_at': datetime(2000, 1, 1)})
+            db.session.commit()
+
+        url = '/api/v1/menu/1?include=menu_items.meal'
+        res = self.client().get(url, headers=caterer_header)
+        self.assertEqual(res.status_code, 200)
+        etag = res.headers['ETag']
+
+        res = self.client().put('/api/v1/meals/1',
+                                data=json.dumps({'cost': 300}),
+                                headers=caterer_header)
+        self.assertEqual(res.status_code, 200)
+
+        headers = dict(caterer_header, **{'If-None-Match': etag})
+        res = self.client().get(url, headers=headers)
+        self.assertEqual(res.status_code, 200)
+        json_result = json.loads(res.get_data(as_text=True))
+        self.assertEqual(json_result['menu_items'][0]['meal']['cost'], 300)
+
+    def test_cannot_select_unknown_fields_or_includes(self):
+        customer_header, _ = self.loginCustomer()
+        for query in ('fields[menu_items]=nope', 'include=nope',
+                      'include=menu.menu_items.meal'):
+            res = self.client().get('/api/v1/menu_items?' + query,
+                                    headers=customer_header)
+            self.assertEqual(res.status_code, 400)
+
+    def test_menu_item_validation_takes_one_query(self):
+        statements = []
+        with self.app.app_context():
+            event.listen(db.engine, 'before_cursor_execute',
+                         lambda *args: statements.append(args[2]))
+
+        with self.app.test_request_context(json=json.loads(self.menu_item)):
+            meal, menu = Valid.post_menu_item()
+        self.assertEqual((meal.id, menu.id), (1, 1))
+        self.assertEqual(len(statements), 1)
+
     def createMenu(self, id = 1):
         with self.app.app_context():
             menu = Menu.query.get(id)
@@ -1,5 +1,6 @@
 import json
 import unittest
+from datetime import datetime
 from app import create_app, db
 from app.models import MenuType
 from tests.base import BaseTest
@@ -64,6 +65,62 @@ class MenuTestCase(BaseTest):
         self.assertEqual(res.status_code, 200)
         self.assertIn(b'objects', res.data)
 
+    def test_todays_menu_is_cached_until_it_changes(self):
+        caterer_header, _ = self.loginCaterer()
+        customer_header, _ = self.loginCustomer()
+        res = self.client().post('/api/v1/menu', data=self.menu,
+                                 headers=caterer_header)
+        self.assertEqual(res.status_code, 201)
+
+        res = self.client().get('/api/v1/menu', headers=customer_header)
+        self.assertEqual(res.headers['X-Cache'], 'MISS')
+        first = json.loads(res.get_data(as_text=True))
+
+        res = self.client().get('/api/v1/menu', headers=customer_header)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.headers['X-Cache'], 'HIT')
+        self.assertEqual(json.loads(res.get_data(as_text=True)), first)
+
+        res = self.client().put('/api/v1/menu/1',
+                                data=json.dumps({'category': MenuType.SUPPER}),
+                                headers=caterer_header)
+        self.assertEqual(res.status_code, 200)
+
+        res = self.client().get('/api/v1/menu', headers=customer_header)
+        self.assertEqual(res.headers['X-Cache'], 'MISS')
+
+        res = self.client().get('/api/v1/stats/menu-cache',
+                                headers=caterer_header)
+        json_result = json.loads(res.get_data(as_text=True))
+        self.assertEqual(json_result['hits'], 1)
+        self.assertEqual(json_result['misses'], 2)
+
+    def test_cached_menu_is_not_served_once_changed_elsewhere(self):
+        customer_header, _ = self.loginCustomer()
+        res = self.client().get('/api/v1/menu', headers=customer_header)
+        self.assertEqual(res.headers['X-Cache'], 'MISS')
+        self.assertEqual(json.loads(res.get_data(as_text=True))['objects'], [])
+        etag = res.headers['ETag']
+
+        # as another worker would, without this one dropping its copy
+        with self.app.app_context():
+            now = datetime.utcnow()
+            db.session.execute(
+                'INSERT INTO menus (category, day, created_at, updated_at) '
+                'VALUES (:category, :day, :now, :now)',
+                {'category': MenuType.SUPPER, 'day': str(now.date()),
+                 'now': now})
+            db.session.commit()
+
+        headers = dict(customer_header, **{'If-None-Match': etag})
+        res = self.client().get('/api/v1/menu', headers=headers)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.headers['X-Cache'], 'MISS')
+        self.assertNotEqual(res.headers['ETag'], etag)
+        json_result = json.loads(res.get_data(as_text=True))
+        self.assertEqual(json_result['objects'][0]['category'],
+                         MenuType.SUPPER)
+
     def test_can_get_menu_by_id(self):
         caterer_header, _ = self.loginCaterer()
         res = self.client().post(
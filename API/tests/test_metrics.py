@@ -0,0 +1,84 @@
+import os
+import json
+import tempfile
+import unittest
+import subprocess
+from app import create_app, db
+from tests.base import BaseTest
+
+
+class MetricsTestCase(BaseTest):
+    """ This will test the /metrics endpoint """
+
+    def setUp(self):
+        self.app = create_app(config_name='testing')
+        self.client = self.app.test_client
+
+        with self.app.app_context():
+            db.create_all()
+
+    def scrape(self, headers=None):
+        res = self.client().get('/metrics', headers=headers)
+        self.assertEqual(res.status_code, 200)
+        return res.get_data(as_text=True)
+
+    def test_requests_and_preprocessors_are_timed(self):
+        customer_header, _ = self.loginCustomer()
+        self.client().get('/api/v1/meals', headers=customer_header)
+        self.client().get('/api/v1/meals')
+        res = self.client().get('/api/v1/nowhere')
+        self.assertEqual(res.status_code, 404)
+        text = self.scrape()
+
+        self.assertIn('# TYPE http_request_duration_seconds histogram', text)
+        self.assertIn('http_request_duration_seconds_count'
+                      '{route="/api/v1/meals",method="GET"} 2.0', text)
+        self.assertIn('http_requests_total{route="/api/v1/meals",'
+                      'method="GET",status="401"} 1.0', text)
+        self.assertIn('http_errors_total{status="401"} 1.0', text)
+        self.assertIn('http_requests_total{route="unmatched",'
+                      'method="GET",status="404"} 1.0', text)
+        self.assertIn('http_errors_total{status="404"} 1.0', text)
+        self.assertIn('preprocessor_duration_seconds_bucket'
+                      '{collection="meals",method="GET_MANY",'
+                      'preprocessor="default_auth",le="+Inf"} 2.0', text)
+        self.assertIn('preprocessor_duration_seconds_count'
+                      '{collection="meals",method="GET_MANY",'
+                      'preprocessor="pre_paged"} 1.0', text)
+        self.assertIn('# TYPE db_pool_checkouts_total counter', text)
+
+    def test_workers_metrics_are_added_up(self):
+        directory = tempfile.mkdtemp()
+        self.app.config['METRICS_DIR'] = directory
+        self.app.extensions['metrics'].init_app(self.app)
+        exited = subprocess.Popen(['true'])
+        exited.wait()
+        with open(os.path.join(directory, 'exited.json'), 'w') as file:
+            json.dump({
+                'pid': exited.pid,
+                'counters': [['http_errors_total', [['status', '401']], 3]],
+                'histograms': [],
+                'gauges': [['db_pool_checked_out', 7]],
+            }, file)
+
+        self.client().get('/api/v1/meals')
+        text = self.scrape()
+        self.assertIn('http_errors_total{status="401"} 4.0', text)
+        # gauges of workers that are gone do not count
+        self.assertNotIn('db_pool_checked_out 7', text)
+        self.assertEqual(len(os.listdir(directory)), 2)
+
+    def test_metrics_can_require_a_token(self):
+        self.app.config['METRICS_TOKEN'] = 'scraper'
+        res = self.client().get('/metrics')
+        self.assertEqual(res.status_code, 401)
+        self.scrape({'Authorization': 'Bearer scraper'})
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+
+if __name__ == '__main__':
+    unittest.main()
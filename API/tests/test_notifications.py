@@ -2,6 +2,7 @@ import json
 import unittest
 from app import create_app, db
 from tests.base import BaseTest
+from app.models import MenuType
 
 
 class NotificationTestCase(BaseTest):
@@ -70,6 +71,65 @@ class NotificationTestCase(BaseTest):
 
         self.assertEqual(res.status_code, 400)
 
+    def test_notification_broadcast_to_customers(self):
+        caterer_header, _ = self.loginCaterer()
+        customer_header, id = self.loginCustomer()
+        res = self.client().post(
+            '/api/v1/notifications/broadcast',
+            data=json.dumps(dict(self.notification, audience='customers')),
+            headers=caterer_header
+        )
+        json_result = json.loads(res.get_data(as_text=True))
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual(json_result['recipients'], 1)
+
+        res = self.client().post(
+            '/api/v1/notifications/broadcast',
+            data=json.dumps(dict(self.notification, audience='all')),
+            headers=caterer_header
+        )
+        json_result = json.loads(res.get_data(as_text=True))
+        self.assertEqual(json_result['recipients'], 2)
+
+        res = self.client().get('/api/v1/notifications',
+                                headers=customer_header)
+        json_result = json.loads(res.get_data(as_text=True))
+        self.assertEqual(json_result['num_results'], 2)
+        self.assertEqual(json_result['objects'][0]['user_id'], id)
+        self.assertEqual(json_result['objects'][0]['title'], 'Hello there')
+
+    def test_notification_broadcast_to_menu_customers(self):
+        caterer_header, _ = self.loginCaterer()
+        customer_header, id = self.loginCustomer()
+        res = self.client().post('/api/v1/menu', data=json.dumps({
+            'category': MenuType.LUNCH}), headers=caterer_header)
+        res = self.client().post(
+            '/api/v1/notifications/broadcast',
+            data=json.dumps(dict(self.notification, audience='menu',
+                                 menu_id=1)),
+            headers=caterer_header
+        )
+        json_result = json.loads(res.get_data(as_text=True))
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual(json_result['recipients'], 0)
+
+        res = self.client().post(
+            '/api/v1/notifications/broadcast',
+            data=json.dumps(dict(self.notification, audience='menu',
+                                 menu_id=40)),
+            headers=caterer_header
+        )
+        self.assertEqual(res.status_code, 400)
+
+    def test_customer_cannot_broadcast_notifications(self):
+        customer_header, _ = self.loginCustomer()
+        res = self.client().post(
+            '/api/v1/notifications/broadcast',
+            data=json.dumps(dict(self.notification, audience='all')),
+            headers=customer_header
+        )
+        self.assertEqual(res.status_code, 401)
+
     def test_can_get_all_notifications(self):
         caterer_header, _ = self.loginCaterer()
         customer_header, id = self.loginCustomer()
@@ -1,8 +1,15 @@
+import csv
 import json
+import zlib
 import unittest
+from datetime import datetime
+from flask import g
+from sqlalchemy import event
+from flask_jwt_extended import jwt_required
 from app import create_app, db
+from app.validators import Valid
 from tests.base import BaseTest
-from app.models import MenuType, MenuItem, Menu, Meal
+from app.models import MenuType, MenuItem, Menu, Meal, User, UserType
 
 
 class OrderTestCase(BaseTest):
@@ -119,6 +126,144 @@ class OrderTestCase(BaseTest):
         self.assertEqual(res.status_code, 200)
         self.assertEqual(json_result['menu_item_id'], 2)
 
+    def test_order_writes_authorize_from_token_claims(self):
+        caterer_header, _ = self.loginCaterer()
+        customer_header, id = self.loginCustomer()
+        menu_item_id = self.createMenuItem()
+        with self.app.app_context():
+            res = self.client().post(
+                '/api/v1/orders',
+                data=json.dumps({'menu_item_id': menu_item_id}),
+                headers=customer_header
+            )
+            self.assertEqual(res.status_code, 201)
+            self.assertEqual(g.user_lookups, 0)
+
+            res = self.client().put(
+                '/api/v1/orders/1',
+                data=json.dumps({'quantity': 2}),
+                headers=customer_header
+            )
+            self.assertEqual(res.status_code, 200)
+            self.assertEqual(g.user_lookups, 0)
+
+            res = self.client().get('/api/v1/orders', headers=customer_header)
+            self.assertEqual(res.status_code, 200)
+            self.assertEqual(g.user_lookups, 0)
+
+    def test_role_change_invalidates_token(self):
+        customer_header, id = self.loginCustomer()
+        with self.app.app_context():
+            user = User.query.get(id)
+            user.role = UserType.CATERER
+            db.session.commit()
+
+        res = self.client().get('/api/v1/orders', headers=customer_header)
+        self.assertEqual(res.status_code, 401)
+
+        customer_header, _ = self.loginCustomer()
+        res = self.client().get('/api/v1/orders', headers=customer_header)
+        self.assertEqual(res.status_code, 200)
+
+    def test_role_change_reaches_other_workers(self):
+        customer_header, id = self.loginCustomer()
+        other_worker = create_app(config_name='testing')
+        res = other_worker.test_client().get('/api/v1/orders',
+                                             headers=customer_header)
+        self.assertEqual(res.status_code, 200)
+
+        with self.app.app_context():
+            user = User.query.get(id)
+            user.role = UserType.CATERER
+            db.session.commit()
+
+        # the other worker reads the change from the blacklist table
+        other_worker.extensions['revoked_tokens'].last_refresh = 0
+        res = other_worker.test_client().get('/api/v1/orders',
+                                             headers=customer_header)
+        self.assertEqual(res.status_code, 401)
+
+    def test_batch_order_creation(self):
+        caterer_header, _ = self.loginCaterer()
+        customer_header, id = self.loginCustomer()
+        res = self.client().post(
+            '/api/v1/orders/batch',
+            data=json.dumps({'orders': [
+                {'menu_item_id': self.createMenuItem()},
+                {'menu_item_id': self.createMenuItem(id=2), 'quantity': 3},
+            ]}),
+            headers=customer_header
+        )
+        json_result = json.loads(res.get_data(as_text=True))
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual(json_result['num_results'], 2)
+        self.assertEqual(json_result['objects'][1]['quantity'], 3)
+        self.assertEqual(json_result['objects'][0]['user_id'], id)
+        self.assertEqual(json_result['objects'][1]['menu_item']['id'], 2)
+
+    def test_batch_order_is_all_or_nothing(self):
+        caterer_header, _ = self.loginCaterer()
+        customer_header, id = self.loginCustomer()
+        res = self.client().post(
+            '/api/v1/orders/batch',
+            data=json.dumps({'orders': [
+                {'menu_item_id': self.createMenuItem()},
+                {'menu_item_id': 40},
+            ]}),
+            headers=customer_header
+        )
+        json_result = json.loads(res.get_data(as_text=True))
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(len(json_result['errors']), 1)
+
+        res = self.client().get('/api/v1/orders', headers=customer_header)
+        json_result = json.loads(res.get_data(as_text=True))
+        self.assertEqual(json_result['num_results'], 0)
+
+    def test_orders_can_be_paged_with_a_cursor(self):
+        caterer_header, _ = self.loginCaterer()
+        customer_header, id = self.loginCustomer()
+        menu_item_id = self.createMenuItem()
+        res = self.client().post(
+            '/api/v1/orders/batch',
+            data=json.dumps({'orders': [{'menu_item_id': menu_item_id}] * 3}),
+            headers=customer_header
+        )
+        self.assertEqual(res.status_code, 201)
+
+        res = self.client().get('/api/v1/orders?cursor=&results_per_page=2',
+                                headers=customer_header)
+        json_result = json.loads(res.get_data(as_text=True))
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual([order['id'] for order in json_result['objects']],
+                         [3, 2])
+
+        # a new order must not shift the next page
+        res = self.client().post(
+            '/api/v1/orders',
+            data=json.dumps({'menu_item_id': menu_item_id}),
+            headers=customer_header
+        )
+        self.assertEqual(res.status_code, 201)
+
+        res = self.client().get(
+            '/api/v1/orders?results_per_page=2&cursor={}'.format(
+                json_result['next']),
+            headers=customer_header
+        )
+        json_result = json.loads(res.get_data(as_text=True))
+        self.assertEqual([order['id'] for order in json_result['objects']],
+                         [1])
+        self.assertIsNone(json_result['next'])
+
+        res = self.client().get('/api/v1/orders?cursor=nonsense',
+                                headers=customer_header)
+        self.assertEqual(res.status_code, 400)
+
+        res = self.client().get('/api/v1/orders?cursor=&fields[orders]=id',
+                                headers=customer_header)
+        self.assertEqual(res.status_code, 400)
+
     def test_order_deletion(self):
         caterer_header, _ = self.loginCaterer()
         customer_header, id = self.loginCustomer()
@@ -138,6 +283,158 @@ class OrderTestCase(BaseTest):
         res = self.client().get('/api/v1/orders/1', headers=customer_header)
         self.assertEqual(res.status_code, 404)
 
+    def test_orders_can_be_streamed(self):
+        caterer_header, _ = self.loginCaterer()
+        customer_header, id = self.loginCustomer()
+        res = self.client().post(
+            '/api/v1/orders/batch',
+            data=json.dumps({
+                'orders': [{'menu_item_id': self.createMenuItem()}] * 12
+            }),
+            headers=customer_header
+        )
+        self.assertEqual(res.status_code, 201)
+
+        res = self.client().get('/api/v1/orders?stream=true',
+                                headers=caterer_header)
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(res.is_streamed)
+        json_result = json.loads(res.get_data(as_text=True))
+        self.assertEqual(json_result['num_results'], 12)
+        self.assertEqual([order['id'] for order in json_result['objects']],
+                         list(range(1, 13)))
+        self.assertEqual(json_result['objects'][0]['menu_item']['id'], 1)
+
+        res = self.client().get('/api/v1/orders?stream=true&q={}'.format(
+            json.dumps({'filters': [
+                {'name': 'id', 'op': 'gt', 'val': 10}
+            ]})), headers=caterer_header)
+        json_result = json.loads(res.get_data(as_text=True))
+        self.assertEqual(json_result['num_results'], 2)
+
+    def test_caterer_can_export_orders_as_csv(self):
+        caterer_header, _ = self.loginCaterer()
+        customer_header, id = self.loginCustomer()
+        res = self.client().post(
+            '/api/v1/orders/batch',
+            data=json.dumps({'orders': [
+                {'menu_item_id': self.createMenuItem(), 'quantity': 3},
+                {'menu_item_id': self.createMenuItem(id=2)},
+            ]}),
+            headers=customer_header
+        )
+        self.assertEqual(res.status_code, 201)
+
+        today = str(datetime.utcnow().date())
+        path = '/api/v1/orders/export?from={0}&to={0}'.format(today)
+        res = self.client().get(path, headers=caterer_header)
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(res.is_streamed)
+        self.assertEqual(res.mimetype, 'text/csv')
+        rows = list(csv.DictReader(res.get_data(as_text=True).splitlines()))
+        self.assertEqual([row['order_id'] for row in rows], ['1', '2'])
+        self.assertEqual(rows[0]['meal_name'], 'ugali 1')
+        self.assertEqual(float(rows[0]['total']), 600)
+
+        res = self.client().get(path + '&gzip=true', headers=caterer_header)
+        self.assertEqual(res.mimetype, 'application/gzip')
+        text = zlib.decompress(
+            res.get_data(), zlib.MAX_WBITS | 16).decode('utf-8')
+        self.assertEqual(len(text.splitlines()), 3)
+
+        res = self.client().get('/api/v1/orders/export?from=2018-05-01',
+                                headers=caterer_header)
+        self.assertEqual(len(res.get_data(as_text=True).splitlines()), 3)
+        res = self.client().get('/api/v1/orders/export?from=nope',
+                                headers=caterer_header)
+        self.assertEqual(res.status_code, 400)
+        res = self.client().get(path, headers=customer_header)
+        self.assertEqual(res.status_code, 401)
+
+    def test_order_validation_takes_one_query(self):
+        customer_header, _ = self.loginCustomer()
+        menu_item_id = self.createMenuItem()
+        # load the revoked tokens before counting
+        self.client().get('/api/v1/orders', headers=customer_header)
+        statements = []
+        with self.app.app_context():
+            event.listen(db.engine, 'before_cursor_execute',
+                         lambda *args: statements.append(args[2]))
+
+        with self.app.test_request_context(
+                headers=customer_header, json={'menu_item_id': menu_item_id}):
+            del statements[:]
+            menu_item = jwt_required(Valid.post_order)()
+            self.assertEqual(menu_item.id, menu_item_id)
+            self.assertEqual(menu_item.menu.id, 1)
+        self.assertEqual(len(statements), 1)
+
+    def test_single_order_is_loaded_once_per_request(self):
+        customer_header, _ = self.loginCustomer()
+        res = self.client().post(
+            '/api/v1/orders',
+            data=json.dumps({'menu_item_id': self.createMenuItem()}),
+            headers=customer_header
+        )
+        self.assertEqual(res.status_code, 201)
+        statements = []
+        with self.app.app_context():
+            event.listen(db.engine, 'before_cursor_execute',
+                         lambda *args: statements.append(args[2]))
+
+        def order_loads():
+            loads = [statement for statement in statements
+                     if statement.startswith('SELECT orders.id AS orders_id')]
+            del statements[:]
+            return len(loads)
+
+        res = self.client().get('/api/v1/orders/1', headers=customer_header)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(order_loads(), 1)
+
+        res = self.client().put(
+            '/api/v1/orders/1',
+            data=json.dumps({'quantity': 3}),
+            headers=customer_header
+        )
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(json.loads(res.get_data(as_text=True))['quantity'],
+                         3)
+        # once to check it, once more to send it as committed
+        self.assertEqual(order_loads(), 2)
+
+    def test_listing_runs_the_same_queries_for_any_number_of_rows(self):
+        caterer_header, _ = self.loginCaterer()
+        customer_header, id = self.loginCustomer()
+        statements = []
+
+        def count_queries(*args):
+            statements.append(args[2])
+
+        def queries_for(path, orders):
+            for number in range(orders):
+                res = self.client().post(
+                    '/api/v1/orders',
+                    data=json.dumps({
+                        'menu_item_id': self.createMenuItem(id=number + 1),
+                    }),
+                    headers=customer_header
+                )
+                self.assertEqual(res.status_code, 201)
+            del statements[:]
+            res = self.client().get(path, headers=caterer_header)
+            self.assertEqual(res.status_code, 200)
+            return len(statements)
+
+        with self.app.app_context():
+            event.listen(db.engine, 'before_cursor_execute', count_queries)
+        # warm up whatever gets loaded once per process
+        queries_for('/api/v1/orders', 0)
+        for path in ('/api/v1/orders', '/api/v1/menu_items'):
+            few = queries_for(path, 1)
+            many = queries_for(path, 5)
+            self.assertEqual(few, many, path)
+
     def createMenuItem(self, id = 1):
         with self.app.app_context():
             menu_item = MenuItem.query.get(id)
@@ -146,7 +443,7 @@ class OrderTestCase(BaseTest):
                 if not menu:
                     menu = Menu(category=MenuType.BREAKFAST)
                     menu.save()
-                meal_name = 'ugali'
+                meal_name = 'ugali {}'.format(id)
                 meal = Meal.query.filter_by(name=meal_name).first()
                 if not meal:
                     meal = Meal(name=meal_name, img_path='#', cost=200)
@@ -0,0 +1,201 @@
+import json
+import unittest
+from datetime import datetime
+from sqlalchemy import event
+from app import create_app, db
+from app.models import (
+    DailyOrders, Meal, Menu, MenuItem, MenuType, Order
+)
+from app.reports import rebuild_rollups, update_orders, delete_orders
+from tests.base import BaseTest
+
+
+class ReportTestCase(BaseTest):
+    """ This will test the caterer reports and the rollups behind them """
+
+    def setUp(self):
+        self.app = create_app(config_name='testing')
+        self.client = self.app.test_client
+        self.headers = {'Content-Type' : 'application/json'}
+        self.today = str(datetime.utcnow().date())
+
+        with self.app.app_context():
+            db.create_all()
+            self.lunch = self.createMenuItem('Pilau', 300, MenuType.LUNCH)
+            self.supper = self.createMenuItem('Ugali', 100, MenuType.SUPPER)
+
+    def rollups(self):
+        with self.app.app_context():
+            return sorted(
+                (str(row.day), row.menu_item_id, row.orders, row.quantity)
+                for row in DailyOrders.query.all())
+
+    def test_rollups_follow_order_writes(self):
+        customer_header, _ = self.loginCustomer()
+        res = self.client().post(
+            '/api/v1/orders/batch',
+            data=json.dumps({'orders': [
+                {'menu_item_id': self.lunch, 'quantity': 2},
+                {'menu_item_id': self.lunch, 'quantity': 1},
+                {'menu_item_id': self.supper, 'quantity': 4},
+            ]}),
+            headers=customer_header
+        )
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual(self.rollups(), [
+            (self.today, self.lunch, 2, 3),
+            (self.today, self.supper, 1, 4),
+        ])
+
+        res = self.client().put(
+            '/api/v1/orders/1',
+            data=json.dumps({'menu_item_id': self.supper, 'quantity': 5}),
+            headers=customer_header
+        )
+        self.assertEqual(res.status_code, 200)
+        res = self.client().delete('/api/v1/orders/2',
+                                   headers=customer_header)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(self.rollups(), [(self.today, self.supper, 2, 9)])
+
+        # the incremental rollups match rolling up from scratch
+        rollups = self.rollups()
+        with self.app.app_context():
+            rebuild_rollups(db.session.connection())
+            db.session.commit()
+        self.assertEqual(self.rollups(), rollups)
+
+    def test_bulk_order_writes_only_recount_what_they_touch(self):
+        customer_header, _ = self.loginCustomer()
+        res = self.client().post(
+            '/api/v1/orders/batch',
+            data=json.dumps({'orders': [
+                {'menu_item_id': self.lunch, 'quantity': 2},
+                {'menu_item_id': self.lunch, 'quantity': 1},
+                {'menu_item_id': self.supper, 'quantity': 4},
+            ]}),
+            headers=customer_header
+        )
+        self.assertEqual(res.status_code, 201)
+
+        with self.app.app_context():
+            # a stale row only a full rebuild would notice
+            DailyOrders.query.filter_by(menu_item_id=self.supper) \
+                .update({'orders': 7})
+            update_orders(Order.query.filter_by(quantity=2),
+                          {'menu_item_id': self.supper},
+                          synchronize_session=False)
+            db.session.commit()
+        self.assertEqual(self.rollups(), [
+            (self.today, self.lunch, 1, 1),
+            (self.today, self.supper, 2, 6),
+        ])
+
+        with self.app.app_context():
+            DailyOrders.query.filter_by(menu_item_id=self.lunch) \
+                .update({'orders': 7})
+            delete_orders(Order.query.filter_by(menu_item_id=self.supper),
+                          synchronize_session=False)
+            db.session.commit()
+        self.assertEqual(self.rollups(), [(self.today, self.lunch, 7, 1)])
+
+        with self.app.app_context():
+            with self.assertRaises(RuntimeError):
+                Order.query.delete()
+            db.session.rollback()
+            self.assertEqual(Order.query.count(), 1)
+
+    def test_first_orders_of_a_day_placed_at_once_are_both_counted(self):
+        customer_header, _ = self.loginCustomer()
+        raced = []
+
+        def insert_first(conn, clauseelement, multiparams, params):
+            # another worker counts its order in between this one finding
+            # no row and inserting it
+            statement = str(clauseelement.compile(dialect=conn.dialect))
+            if not raced and statement.startswith(
+                    ('INSERT INTO daily_orders', 'INSERT OR IGNORE INTO')):
+                raced.append(statement)
+                conn.execute(DailyOrders.__table__.insert().values(
+                    day=datetime.utcnow().date(), menu_item_id=self.lunch,
+                    orders=1, quantity=2))
+
+        with self.app.app_context():
+            event.listen(db.engine, 'before_execute', insert_first)
+            try:
+                res = self.client().post(
+                    '/api/v1/orders',
+                    data=json.dumps({'menu_item_id': self.lunch,
+                                     'quantity': 3}),
+                    headers=customer_header
+                )
+            finally:
+                event.remove(db.engine, 'before_execute', insert_first)
+        self.assertEqual(res.status_code, 201)
+        self.assertTrue(raced)
+        self.assertEqual(self.rollups(), [(self.today, self.lunch, 2, 5)])
+
+    def test_caterer_can_get_reports(self):
+        customer_header, _ = self.loginCustomer()
+        res = self.client().post(
+            '/api/v1/orders/batch',
+            data=json.dumps({'orders': [
+                {'menu_item_id': self.lunch, 'quantity': 2},
+                {'menu_item_id': self.supper, 'quantity': 3},
+            ]}),
+            headers=customer_header
+        )
+        self.assertEqual(res.status_code, 201)
+
+        caterer_header, _ = self.loginCaterer()
+        res = self.client().get('/api/v1/reports/meals',
+                                headers=caterer_header)
+        json_result = json.loads(res.get_data(as_text=True))
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(json_result['objects'], [
+            {'meal_id': 1, 'name': 'Pilau', 'orders': 1, 'quantity': 2,
+             'revenue': 600.0},
+            {'meal_id': 2, 'name': 'Ugali', 'orders': 1, 'quantity': 3,
+             'revenue': 300.0},
+        ])
+
+        res = self.client().get(
+            '/api/v1/reports/categories?from={0}&to={0}'.format(self.today),
+            headers=caterer_header
+        )
+        json_result = json.loads(res.get_data(as_text=True))
+        self.assertEqual(
+            [(row['category'], row['revenue'])
+             for row in json_result['objects']],
+            [(MenuType.LUNCH, 600.0), (MenuType.SUPPER, 300.0)]
+        )
+
+        res = self.client().get('/api/v1/reports/revenue',
+                                headers=caterer_header)
+        json_result = json.loads(res.get_data(as_text=True))
+        self.assertEqual(json_result['objects'], [{
+            'day': self.today, 'orders': 2, 'quantity': 5, 'revenue': 900.0
+        }])
+
+        res = self.client().get('/api/v1/reports/revenue?from=2018-05-02'
+                                '&to=2018-05-01', headers=caterer_header)
+        self.assertEqual(res.status_code, 400)
+
+    def test_customer_cannot_get_reports(self):
+        customer_header, _ = self.loginCustomer()
+        res = self.client().get('/api/v1/reports/meals',
+                                headers=customer_header)
+        self.assertEqual(res.status_code, 401)
+
+    def createMenuItem(self, name, cost, category):
+        menu = Menu(category=category)
+        meal = Meal(name=name, cost=cost, img_path='#')
+        db.session.add_all([menu, meal])
+        db.session.commit()
+        menu_item = MenuItem(menu_id=menu.id, meal_id=meal.id)
+        menu_item.save()
+        return menu_item.id
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import unittest
+from flask_restless.helpers import to_dict, get_relations
+from app import create_app, db
+from app.models import Meal, Menu, MenuItem, MenuType, Order
+from app.serializers import Serializer, benchmark
+from tests.base import BaseTest
+
+
+class SerializerTestCase(BaseTest):
+    """ This will test the precompiled serializers """
+
+    def setUp(self):
+        self.app = create_app(config_name='testing')
+        self.client = self.app.test_client
+
+        with self.app.app_context():
+            db.create_all()
+
+    def test_serializer_matches_flask_restless(self):
+        _, user_id = self.loginCustomer()
+        with self.app.app_context():
+            menu = Menu(category=MenuType.LUNCH)
+            meal = Meal(name='Pilau', cost=350, img_path='#')
+            db.session.add_all([menu, meal])
+            db.session.commit()
+            menu_item = MenuItem(menu_id=menu.id, meal_id=meal.id)
+            menu_item.save()
+            Order(menu_item_id=menu_item.id, user_id=user_id,
+                  quantity=2).save()
+
+            for model in (Meal, Menu, MenuItem, Order):
+                deep = dict((relation, {})
+                            for relation in get_relations(model))
+                instance = model.query.first()
+                self.assertEqual(Serializer(model)(instance),
+                                 to_dict(instance, deep))
+
+    def test_serializer_never_sends_password_hashes(self):
+        self.loginCustomer()
+        res = self.client().get('/api/v1/notifications',
+                                headers=self.loginCaterer()[0])
+        self.assertEqual(res.status_code, 200)
+        self.assertNotIn(b'password_hash', res.data)
+
+    def test_benchmark_times_both_serializers(self):
+        with self.app.app_context():
+            timings = benchmark(rows=10, rounds=1)
+        self.assertEqual(set(timings), set(['to_dict', 'serializer']))
+
+
+if __name__ == '__main__':
+    unittest.main()
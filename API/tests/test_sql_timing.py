@@ -0,0 +1,55 @@
+import re
+import six
+import logging
+import unittest
+from app import create_app, db
+from tests.base import BaseTest
+
+
+class SqlTimingTestCase(BaseTest):
+    """ This will test the per request SQL timing """
+
+    def setUp(self):
+        self.app = create_app(config_name='testing')
+        self.client = self.app.test_client
+
+        with self.app.app_context():
+            db.create_all()
+
+    def test_server_timing_counts_statements(self):
+        customer_header, _ = self.loginCustomer()
+        res = self.client().get('/api/v1/meals', headers=customer_header)
+        self.assertEqual(res.status_code, 200)
+        timing = res.headers['Server-Timing']
+        six.assertRegex(self, timing, r'^db;desc="[1-9]\d* queries";'
+                        r'dur=[\d.]+, app;dur=[\d.]+$')
+
+        self.app.config['SERVER_TIMING'] = False
+        res = self.client().get('/api/v1/meals', headers=customer_header)
+        self.assertNotIn('Server-Timing', res.headers)
+
+    def test_slow_requests_are_logged_with_their_sql(self):
+        customer_header, _ = self.loginCustomer()
+        self.app.config.update(SLOW_REQUEST_QUERIES=0,
+                               SLOW_REQUEST_STATEMENTS=1)
+        records = []
+        handler = logging.Handler(logging.WARNING)
+        handler.emit = records.append
+        self.app.logger.addHandler(handler)
+        try:
+            self.client().get('/api/v1/meals', headers=customer_header)
+        finally:
+            self.app.logger.removeHandler(handler)
+        log, = [record.getMessage() for record in records]
+        self.assertIn('Slow request GET /api/v1/meals?: 200', log)
+        # only one statement was kept
+        self.assertEqual(len(re.findall(r'^ *[\d.]+ms ', log, re.M)), 1)
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+
+if __name__ == '__main__':
+    unittest.main()